@@ -301,14 +301,20 @@ class Ptycho2DDataset(CDataset):
         repeated_random_selection = np.array(repeated_random_selection)
         # Here, I use a fixed random selection for reproducibility
         cut_random_selection =repeated_random_selection.astype(bool)[:len(self)]
-        
-        dataset_1 = deepcopy(self)
+
+        # The per-pattern data is replaced right after copying, so we seed
+        # deepcopy's memo to stop it from duplicating those tensors first
+        per_pattern = [getattr(self, name, None) for name in
+                       ('translations', 'patterns', 'intensities')]
+        memo = {id(data): None for data in per_pattern if data is not None}
+
+        dataset_1 = deepcopy(self, dict(memo))
         dataset_1.translations = self.translations[cut_random_selection]
         dataset_1.patterns = self.patterns[cut_random_selection]
         if hasattr(self, 'intensities') and self.intensities is not None:
             dataset_1.intensities = self.intensities[cut_random_selection]
             
-        dataset_2 = deepcopy(self)
+        dataset_2 = deepcopy(self, dict(memo))
         dataset_2.translations = self.translations[~cut_random_selection]
         dataset_2.patterns = self.patterns[~cut_random_selection]
         if hasattr(self, 'intensities') and self.intensities is not None:
@@ -93,6 +93,58 @@ class CDIModel(t.nn.Module):
         """
         return self.measurement(self.forward_propagator(self.interaction(*args)))
 
+    def compile_forward(self, **kwargs):
+        """Compiles the complete forward model with torch.compile
+
+        After this is called, AD_optimize runs the forward model
+        (interaction, propagation and measurement) as a compiled function.
+        This lets the many small elementwise operations in the measurement,
+        such as the incoherent sum, background and saturation, be fused
+        into a few kernels. The first call after compiling, and any call
+        with a new set of input shapes, will be slow while the model is
+        recompiled.
+
+        Unlike nn.Module.compile(), which only compiles calls made through
+        the module itself, this covers AD_optimize, which calls
+        self.forward directly. Calling self.forward still runs the eager
+        model, and uncompile_forward switches AD_optimize back to it.
+
+        Compilation requires a working torch.compile backend, so it is
+        never done automatically.
+
+        Parameters
+        ----------
+        **kwargs
+            Any keyword arguments to pass on to torch.compile, for
+            example mode='max-autotune'
+        """
+        # We compile the unbound forward function rather than replacing
+        # self.forward with a compiled bound method, which would store a
+        # reference to the model on itself and break deepcopy and pickle
+        self._compile_kwargs = kwargs
+        self._compiled_forward = t.compile(type(self).forward, **kwargs)
+
+
+    def uncompile_forward(self):
+        """Returns AD_optimize to the uncompiled forward model"""
+        self._compile_kwargs = None
+        self._compiled_forward = None
+
+
+    def __getstate__(self):
+        # The compiled forward model can't be pickled, so it is rebuilt
+        # from the torch.compile arguments when the model is restored
+        state = super(CDIModel, self).__getstate__()
+        state.pop('_compiled_forward', None)
+        return state
+
+
+    def __setstate__(self, state):
+        super(CDIModel, self).__setstate__(state)
+        if getattr(self, '_compile_kwargs', None) is not None:
+            self.compile_forward(**self._compile_kwargs)
+
+
     def loss(self, sim_data, real_data):
         raise NotImplementedError()
 
@@ -101,7 +153,8 @@ class CDIModel(t.nn.Module):
         raise NotImplementedError()
 
     
-    def store_detector_geometry(self, detector_geometry, dtype=t.float32):
+    def store_detector_geometry(self, detector_geometry, dtype=t.float32,
+                                persistent=True):
         """Registers the information in a detector geometry dictionary
 
         Information about the detector geometry is passed in as a dictionary,
@@ -115,21 +168,26 @@ class CDIModel(t.nn.Module):
             A dictionary containing at least the two entries 'distance' and 'basis'
         dtype : torch.dtype, default: torch.float32
             The datatype to convert the values to before registering
+        persistent : bool, default: True
+            Whether the buffers are included in the model's state dict
         """
         self.register_buffer('det_basis',
                              t.as_tensor(detector_geometry['basis'],
-                                      dtype=dtype))
+                                      dtype=dtype),
+                             persistent=persistent)
         
         if 'distance' in detector_geometry \
            and detector_geometry['distance'] is not None:                
             self.register_buffer('det_distance',
                                  t.as_tensor(detector_geometry['distance'],
-                                          dtype=dtype))
+                                          dtype=dtype),
+                                 persistent=persistent)
         if 'corner' in detector_geometry \
            and detector_geometry['corner'] is not None:
             self.register_buffer('det_corner',
                                  t.as_tensor(detector_geometry['corner'],
-                                          dtype=dtype))
+                                          dtype=dtype),
+                                 persistent=persistent)
 
     def get_detector_geometry(self):
         """Makes a detector geometry dictionary from the registered buffers
@@ -365,10 +423,14 @@ class CDIModel(t.nn.Module):
             N = 0
             t0 = time.time()
 
+            compiled_forward = getattr(self, '_compiled_forward', None)
+
             # The data loader is responsible for setting the minibatch
             # size, so each set is a minibatch
             for inputs, patterns in data_loader:
-                normalization += t.sum(patterns).cpu().numpy()
+                # We keep the running sums on the device, so we don't force
+                # a synchronization with the host for every minibatch
+                normalization += t.sum(patterns)
                 N += 1
                 def closure():
                     optimizer.zero_grad()
@@ -392,7 +454,10 @@ class CDIModel(t.nn.Module):
                             exit()
 
                         # Run the simulation
-                        sim_patterns = self.forward(*inp)
+                        if compiled_forward is None:
+                            sim_patterns = self.forward(*inp)
+                        else:
+                            sim_patterns = compiled_forward(self, *inp)
 
                         # Calculate the loss
                         if hasattr(self, 'mask'):
@@ -414,10 +479,10 @@ class CDIModel(t.nn.Module):
                     return total_loss
 
                 # This takes the step for this minibatch
-                loss += optimizer.step(closure).detach().cpu().numpy()
+                loss += optimizer.step(closure).detach()
 
-            
-            loss /= normalization
+            # Only now do we bring the results back to the host
+            loss = loss.item() / normalization.item()
 
             # We step the scheduler after the full epoch
             if scheduler is not None:
@@ -40,7 +40,8 @@ class FancyPtycho(CDIModel):
                  exponentiate_obj=False,
                  phase_only=False,
                  dtype=t.float32,
-                 obj_view_crop=0
+                 obj_view_crop=0,
+                 half_precision_propagation=False,
                  ):
 
         super(FancyPtycho, self).__init__()
@@ -82,6 +83,10 @@ class FancyPtycho(CDIModel):
         # Not sure how to make this a buffer...
         self.units = units
 
+        # This only changes how the calculation is run, so it is kept out
+        # of the state dict
+        self.half_precision_propagation = half_precision_propagation
+
         if mask is None:
             self.mask = None
         else:
@@ -100,6 +105,10 @@ class FancyPtycho(CDIModel):
             probe_norm = 1 * t.max(t.abs(probe_guess))
         self.register_buffer('probe_norm', probe_norm.to(dtype))
         
+        # The probe modes are stored as the leading dimension, so each mode
+        # is a contiguous HxW frame. The FFTs all act on the last two
+        # dimensions, and this is the layout batched FFTs want, so it
+        # should not be permuted to put the modes last.
         self.probe = t.nn.Parameter(probe_guess / self.probe_norm)
         self.obj = t.nn.Parameter(obj_guess)
 
@@ -115,6 +124,17 @@ class FancyPtycho(CDIModel):
             
         self.background = t.nn.Parameter(background)
 
+        # complex32 FFTs are only supported by cuFFT, and only for
+        # power-of-two shapes, so we check the shape of the wavefields that
+        # will be propagated here. The device is checked when propagating
+        if half_precision_propagation:
+            prop_shape = [int(oversampling) * s
+                          for s in self.background.shape[-2:]]
+            if any(s & (s - 1) for s in prop_shape):
+                raise ValueError(
+                    'half_precision_propagation requires power-of-two '
+                    f'wavefield shapes, but the shape is {prop_shape}')
+
         if weights is None:
             self.weights = None
         else:
@@ -146,11 +166,14 @@ class FancyPtycho(CDIModel):
         self.register_buffer('translation_scale',
                              t.as_tensor(translation_scale, dtype=dtype))
 
+        # With no probe support, we store None rather than a mask of ones,
+        # so the multiplication can be skipped entirely
         if probe_support is None:
-            probe_support = t.ones_like(self.probe[0], dtype=t.bool)
-        self.register_buffer('probe_support',
-                             t.as_tensor(probe_support, dtype=t.bool))
-        self.probe.data *= self.probe_support
+            self.register_buffer('probe_support', None)
+        else:
+            self.register_buffer('probe_support',
+                                 t.as_tensor(probe_support, dtype=t.bool))
+            self.probe.data *= self.probe_support
             
         self.register_buffer('oversampling',
                              t.as_tensor(oversampling, dtype=int))
@@ -163,12 +186,15 @@ class FancyPtycho(CDIModel):
         if simulate_probe_translation or (self.probe_fourier_shifts is not None):
             Is = t.arange(self.probe.shape[-2], dtype=dtype)
             Js = t.arange(self.probe.shape[-1], dtype=dtype)
-            Is, Js = t.meshgrid(Is/t.max(Is), Js/t.max(Js))
-            
-            I_phase = 2 * np.pi* Is * self.oversampling
-            J_phase = 2 * np.pi* Js * self.oversampling
-            self.register_buffer('I_phase', I_phase)
-            self.register_buffer('J_phase', J_phase)
+
+            # We only store 1D ramps, which get broadcast against each
+            # other when the phase masks are made in probes_and_translations
+            I_phase = 2 * np.pi * (Is / t.max(Is)) * self.oversampling
+            J_phase = 2 * np.pi * (Js / t.max(Js)) * self.oversampling
+            # These are fully determined by the probe shape, so they don't
+            # need to be saved with the rest of the state
+            self.register_buffer('I_phase', I_phase, persistent=False)
+            self.register_buffer('J_phase', J_phase, persistent=False)
             
 
         self.register_buffer('simulate_finite_pixels',
@@ -185,6 +211,23 @@ class FancyPtycho(CDIModel):
             raise KeyError('Specified loss function not supported')
 
 
+    def _load_from_state_dict(self, state_dict, prefix, *args, **kwargs):
+        # Older versions saved I_phase and J_phase in the state dict. They
+        # are now regenerated in __init__, so we drop them when loading
+        for name in ['I_phase', 'J_phase']:
+            state_dict.pop(prefix + name, None)
+
+        # Older versions also always saved a probe support, even when it
+        # was all ones. If one is given, we make room to load it
+        if (self.probe_support is None
+                and prefix + 'probe_support' in state_dict):
+            self.register_buffer('probe_support', t.empty_like(
+                state_dict[prefix + 'probe_support'],
+                dtype=t.bool, device=self.probe.device))
+
+        super()._load_from_state_dict(state_dict, prefix, *args, **kwargs)
+
+
     @classmethod
     def from_dataset(cls,
                      dataset,
@@ -210,6 +253,7 @@ class FancyPtycho(CDIModel):
                      phase_only=False,
                      obj_view_crop=None,
                      obj_padding=200,
+                     half_precision_propagation=False,
                      ):
 
         wavelength = dataset.wavelength
@@ -304,15 +348,19 @@ class FancyPtycho(CDIModel):
         else:
             probe_basis = obj_basis.clone()
             
-        # Now we initialize all the subdominant probe modes
         probe_max = t.max(t.abs(probe))
-        probe_stack = [0.01 * probe_max * t.rand(probe.shape, dtype=probe.dtype) for i in range(n_modes - 1)]
 
         # For a Fourier space probe
         if fourier_probe:
             probe = tools.propagators.far_field(probe)
 
-        probe = t.stack([probe, ] + probe_stack)
+        # Now we initialize all the subdominant probe modes, filling them
+        # directly into a single preallocated stack
+        probe_stack = t.empty((n_modes,) + probe.shape, dtype=probe.dtype)
+        probe_stack[0] = probe
+        probe_stack[1:] = 0.01 * probe_max * t.rand(
+            (n_modes - 1,) + probe.shape, dtype=probe.dtype)
+        probe = probe_stack
 
         obj = (randomize_ang * (t.rand(obj_size)-0.5)).to(dtype=t.complex64)
         if not exponentiate_obj:
@@ -371,14 +419,16 @@ class FancyPtycho(CDIModel):
             mask = None
 
         if probe_support_radius is not None:
-            probe_support = t.zeros(probe[0].shape, dtype=t.bool)
-            xs, ys = np.mgrid[:probe.shape[-2], :probe.shape[-1]]
-            xs = xs - np.mean(xs)
-            ys = ys - np.mean(ys)
-            Rs = np.sqrt(xs**2 + ys**2)
+            xs = t.arange(probe.shape[-2], dtype=t.float32)
+            ys = t.arange(probe.shape[-1], dtype=t.float32)
+            xs = xs - t.mean(xs)
+            ys = ys - t.mean(ys)
 
-            probe_support[Rs < probe_support_radius] = 1
-            probe = probe * probe_support[None, :, :]
+            # Comparing the squared radius avoids building the full
+            # grid of radii just to take a square root
+            probe_support = (xs[:, None]**2 + ys[None, :]**2
+                             < probe_support_radius**2)
+            probe *= probe_support
 
         else:
             probe_support = None
@@ -400,14 +450,46 @@ class FancyPtycho(CDIModel):
                    simulate_finite_pixels=simulate_finite_pixels,
                    phase_only=phase_only,
                    exponentiate_obj=exponentiate_obj,
-                   obj_view_crop=obj_view_crop)
+                   obj_view_crop=obj_view_crop,
+                   half_precision_propagation=half_precision_propagation)
 
 
-    def interaction(self, index, translations, *args):
+    def get_masked_probe(self):
+        """Returns the basis probes, restricted to the probe support
 
-        # The *args is included so that this can work even when given, say,
-        # a polarized ptycho dataset that might spit out more inputs.
+        Returns
+        -------
+        masked_probe : torch.Tensor
+            The basis probes multiplied by the probe support
+        """
+        if self.probe_support is None:
+            return self.probe
+
+        return self.probe * self.probe_support[..., :, :]
+
+
+    def probes_and_translations(self, index, translations):
+        """Constructs the probes and pixel translations for a set of shots
+
+        This is the first stage of the interaction model, which consists
+        mostly of small elementwise operations. It is kept separate so that
+        it can be compiled into a few fused kernels with
+        compile_probes_and_translations.
 
+        Parameters
+        ----------
+        index : torch.Tensor or slice
+            The indices of the shots to simulate
+        translations : torch.Tensor
+            The Nx3 array of translations for those shots
+
+        Returns
+        -------
+        prs : torch.Tensor
+            The probes for each shot, before any Fourier padding
+        pix_trans : torch.Tensor
+            The Nx2 array of translations for each shot, in pixels
+        """
         # Step 1 is to convert the translations for each position into a
         # value in pixels
         pix_trans = tools.interactions.translations_to_pixel(
@@ -421,37 +503,37 @@ class FancyPtycho(CDIModel):
                           self.translation_offsets[index])
 
         # This restricts the basis probes to stay within the probe support
-        basis_prs = self.probe * self.probe_support[..., :, :]
+        basis_prs = self.get_masked_probe()
 
         # For a Fourier-space probe, we take an IFT
         if self.fourier_probe:
             basis_prs = tools.propagators.inverse_far_field(basis_prs)
             
         # Now we construct the probes for each shot from the basis probes
-        if self.weights is not None:
-            Ws = self.weights[index]
-        else:
-            try:
-                Ws = t.ones(len(index)) # I'm positive this introduced a bug
-            except:
-                Ws = 1
-
-        if self.weights is None or len(self.weights[0].shape) == 0:
+        if self.weights is None:
+            # With no weights at all, there is nothing to multiply. The basis
+            # probes get broadcast against the translations later on
+            prs = basis_prs
+        elif self.weights.dim() == 1:
             # If a purely stable coherent illumination is defined
+            Ws = self.weights[index]
             prs = Ws[..., None, None, None] * basis_prs
         else:
             # If a frame-by-frame weight matrix is defined
             # This takes the dot product of all the weight matrices with
             # the probes. The output has dimensions of translation, then
-            # coherent mode index, then x,y, and then complex index
-            # Maybe this can be done with a matmul now?
-            prs = t.sum(Ws[..., None, None] * basis_prs, axis=-3)
+            # coherent mode index, then x,y. Using einsum lets this run as
+            # a single complex matmul, rather than materializing the full
+            # broadcasted product before summing over the basis modes
+            Ws = self.weights[index]
+            prs = t.einsum('...rm,mhw->...rhw', Ws, basis_prs)
         
         if self.simulate_probe_translation or (self.probe_fourier_shifts is not None):
             if self.probe_fourier_shifts is not None:
                 det_pix_trans = self.probe_fourier_shifts[index]
             else:
-                det_pix_trans = t.zeros_like(translations)
+                det_pix_trans = translations.new_zeros(
+                    translations.shape[:-1] + (2,))
 
             if self.simulate_probe_translation:
                 det_pix_trans = det_pix_trans +  tools.interactions.translations_to_pixel(
@@ -460,12 +542,61 @@ class FancyPtycho(CDIModel):
                     surface_normal=self.surface_normal)
 
                 
-            probe_masks = t.exp(1j* (det_pix_trans[:,0,None,None] *
-                                     self.I_phase[None,...] +
-                                     det_pix_trans[:,1,None,None] *
-                                     self.J_phase[None,...]))
+            # The leading dimensions are left implicit, so this also
+            # works for a single shot with a 1D translation
+            phase = (det_pix_trans[...,0,None,None] * self.I_phase[:,None]
+                     + det_pix_trans[...,1,None,None] * self.J_phase[None,:])
+            # t.polar builds the phase ramp directly, instead of first
+            # making a complex phase and then exponentiating it
+            probe_masks = t.polar(t.ones_like(phase), phase)
             prs = prs * probe_masks[...,None,:,:]
 
+        return prs, pix_trans
+
+
+    def compile_probes_and_translations(self, **kwargs):
+        """Compiles the probe and translation setup with torch.compile
+
+        After this is called, the interaction will run
+        probes_and_translations as a compiled function, fusing the chain of
+        small elementwise operations it performs. The first call after
+        compiling will be slow, and compilation requires a working
+        torch.compile backend. As with compile_forward, the unbound method
+        is compiled, so the model doesn't hold a reference to itself.
+
+        Parameters
+        ----------
+        **kwargs
+            Any keyword arguments to pass on to torch.compile
+        """
+        self._probes_compile_kwargs = kwargs
+        self._compiled_probes_and_translations = t.compile(
+            type(self).probes_and_translations, **kwargs)
+
+
+    def __getstate__(self):
+        state = super(FancyPtycho, self).__getstate__()
+        state.pop('_compiled_probes_and_translations', None)
+        return state
+
+
+    def __setstate__(self, state):
+        super(FancyPtycho, self).__setstate__(state)
+        if getattr(self, '_probes_compile_kwargs', None) is not None:
+            self.compile_probes_and_translations(
+                **self._probes_compile_kwargs)
+
+
+    def interaction(self, index, translations, *args):
+
+        # The *args is included so that this can work even when given, say,
+        # a polarized ptycho dataset that might spit out more inputs.
+
+        compiled = getattr(self, '_compiled_probes_and_translations', None)
+        if compiled is None:
+            prs, pix_trans = self.probes_and_translations(index, translations)
+        else:
+            prs, pix_trans = compiled(self, index, translations)
 
         # We automatically rescale the probe to match the background size,
         # which allows us to do stuff like let the object be super-resolution,
@@ -502,6 +633,20 @@ class FancyPtycho(CDIModel):
 
 
     def forward_propagator(self, wavefields):
+        if self.half_precision_propagation:
+            # This halves the memory traffic of the FFT, but complex32 FFTs
+            # are only supported by cuFFT, and only for power-of-two shapes.
+            # We cast back up before the measurement, because the summed
+            # intensities can easily overflow a float16
+            if not wavefields.is_cuda:
+                raise RuntimeError(
+                    'half_precision_propagation is only supported on CUDA '
+                    'devices, but the wavefields are on '
+                    f'{wavefields.device}')
+            propagated = tools.propagators.far_field(
+                wavefields.to(t.complex32))
+            return propagated.to(t.complex64)
+
         return tools.propagators.far_field(wavefields)
 
 
@@ -548,23 +693,24 @@ class FancyPtycho(CDIModel):
         wavelength = self.wavelength
         indices, translations = args_list
 
-        data = []
-        len(indices)
         if calculation_width is None:
             calculation_width = len(indices)
-        index_chunks = [indices[i:i + calculation_width]
-                        for i in range(0, len(indices),
-                                       calculation_width)]
-        translation_chunks = [translations[i:i + calculation_width]
-                              for i in range(0, len(indices),
-                                             calculation_width)]
-        
-            
-        # Then we simulate the results
-        data = [self.forward(idx, trans).detach()
-                for idx, trans in zip(index_chunks, translation_chunks)]
 
-        data = t.cat(data, dim=0)
+        # Then we simulate the results. The output is allocated once we
+        # know the pattern shape, and each chunk is written directly into
+        # it, so we never hold both the chunks and the concatenated data
+        device = self.probe.device
+        data = None
+        with t.no_grad():
+            for i in range(0, len(indices), calculation_width):
+                idx = indices[i:i + calculation_width]
+                trans = translations[i:i + calculation_width].to(
+                    device=device)
+                sim = self.forward(idx, trans)
+                if data is None:
+                    data = t.empty((len(indices),) + sim.shape[1:],
+                                   dtype=sim.dtype, device=sim.device)
+                data[i:i + len(sim)] = sim
         # And finally, we make the dataset
         return Ptycho2DDataset(
             translations, data,
@@ -576,8 +722,14 @@ class FancyPtycho(CDIModel):
 
 
     def corrected_translations(self, dataset):
+        # A non-blocking copy only helps when copying from pinned host
+        # memory to the GPU, and it isn't safe for copies to the host,
+        # which could be read before the copy finishes
+        device = self.probe.device
+        non_blocking = (dataset.translations.is_pinned()
+                        and device.type == 'cuda')
         translations = dataset.translations.to(
-            dtype=t.float32, device=self.probe.device)
+            dtype=t.float32, device=device, non_blocking=non_blocking)
         if (hasattr(self, 'translation_offsets') and
             self.translation_offsets is not None):
             t_offset = tools.interactions.pixel_to_translations(
@@ -621,7 +773,6 @@ class FancyPtycho(CDIModel):
         # First we treat the incoherent but stable  case, where the weights are
         # just one per-shot overall weight
         if self.weights.dim() == 1:
-            probe = self.probe.detach().cpu().numpy()
             ortho_probes = analysis.orthogonalize_probes(self.probe.detach())
             self.probe.data = ortho_probes
             return
@@ -633,8 +784,10 @@ class FancyPtycho(CDIModel):
         # We concatenate all the weight matrices, to come up with a state
         # corresponding to the summed light field across all the exposures.
         # This state will have a large number of modes, but all built from
-        # the same small number of basis modes
-        all_weights = t.cat(t.unbind(self.weights.detach(), dim=0), dim=0)
+        # the same small number of basis modes. Stacking the matrices along
+        # the first axis is just a reshape, so this doesn't copy anything
+        all_weights = self.weights.detach().reshape(
+            -1, self.weights.shape[-1])
 
         # We generate the orthogonal probes based on this full-experiment
         # representation of the light field.
@@ -656,8 +809,8 @@ class FancyPtycho(CDIModel):
         
         # We now replace the shot-to-shot weights with the versions that have
         # been re-expressed in the new basis. 
-        new_weights = t.stack(t.split(reexpressed_weights,
-                                      self.weights.shape[1]), dim=0)
+        new_weights = reexpressed_weights.reshape(
+            self.weights.shape[0], self.weights.shape[1], -1)
 
         # And we save it back to the model
         self.probe.data = ortho_probes.to(
@@ -688,9 +841,8 @@ class FancyPtycho(CDIModel):
     
     def plot_wavefront_variation(self, dataset, fig=None, mode='amplitude', **kwargs):
         def get_probes(idx):
-            basis_prs = self.probe * self.probe_support[..., :, :]
-            prs = t.sum(self.weights[idx, :, :, None, None] * basis_prs,
-                        axis=-3)
+            basis_prs = self.get_masked_probe()
+            prs = t.einsum('rm,mhw->rhw', self.weights[idx], basis_prs)
             ortho_probes = analysis.orthogonalize_probes(prs)
 
             if mode.lower() == 'amplitude':
@@ -701,17 +853,15 @@ class FancyPtycho(CDIModel):
             if mode.lower() == 'phase':
                 return np.angle(ortho_probes.detach().cpu().numpy())
 
-        probe_matrix = np.zeros([self.probe.shape[0]]*2,
-                                dtype=np.complex64)
+        # The matrix of overlaps between all the basis probes
         np_probes = self.probe.detach().cpu().numpy()
-        for i in range(probe_matrix.shape[0]):
-            for j in range(probe_matrix.shape[0]):
-                probe_matrix[i,j] = np.sum(np_probes[i]*np_probes[j].conj())
+        flat_probes = np_probes.reshape(np_probes.shape[0], -1)
+        probe_matrix = flat_probes @ flat_probes.conj().T
 
         weights = self.weights.detach().cpu().numpy()
 
-        probe_intensities = np.sum(np.tensordot(weights, probe_matrix, axes=1)
-                                   * weights.conj(), axis=2)
+        probe_intensities = np.einsum('nij,jk,nik->ni', weights,
+                                      probe_matrix, weights.conj())
 
         # Imaginary part is already essentially zero up to rounding error
         probe_intensities = np.real(probe_intensities)
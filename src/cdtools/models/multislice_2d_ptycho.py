@@ -22,7 +22,9 @@ class Multislice2DPtycho(CDIModel):
 
     @property
     def obj(self):
-        return t.complex(self.obj_real, self.obj_imag)
+        # The object is stored as a single real tensor with a trailing
+        # (real, imag) axis, so this is a view and never copies
+        return t.view_as_complex(self.obj_ri)
 
     def __init__(self,
                  wavelength,
@@ -50,23 +52,24 @@ class Multislice2DPtycho(CDIModel):
                  ):
 
         super(Multislice2DPtycho, self).__init__()
-        self.wavelength = t.tensor(wavelength)
-        self.detector_geometry = copy(detector_geometry)
+
+        # The fixed tensors are registered as non-persistent buffers, so
+        # nn.Module.to moves them along with the parameters, but the
+        # contents of the state dict are not changed
+        self.register_buffer('wavelength', t.as_tensor(wavelength),
+                             persistent=False)
+        self.store_detector_geometry(detector_geometry, persistent=False)
         self.dz = dz
         self.nz = nz
-        det_geo = self.detector_geometry
-        if hasattr(det_geo, 'distance'):
-            det_geo['distance'] = t.tensor(det_geo['distance'])
-        if hasattr(det_geo, 'basis'):
-            det_geo['basis'] = t.tensor(det_geo['basis'])
-        if hasattr(det_geo, 'corner'):
-            det_geo['corner'] = t.tensor(det_geo['corner'])
 
-        self.min_translation = t.tensor(min_translation)
+        self.register_buffer('min_translation', t.as_tensor(min_translation),
+                             persistent=False)
 
-        self.probe_basis = t.tensor(probe_basis)
+        self.register_buffer('probe_basis', t.as_tensor(probe_basis),
+                             persistent=False)
         self.detector_slice = copy(detector_slice)
-        self.surface_normal = t.tensor(surface_normal)
+        self.register_buffer('surface_normal', t.as_tensor(surface_normal),
+                             persistent=False)
 
         self.saturation = saturation
         self.subpixel = subpixel
@@ -76,27 +79,29 @@ class Multislice2DPtycho(CDIModel):
         self.phase_only = phase_only
         self.prevent_aliasing = prevent_aliasing
 
-        if mask is None:
-            self.mask = mask
-        else:
-            self.mask = t.tensor(mask, dtype=t.bool)
+        if mask is not None:
+            mask = t.as_tensor(mask, dtype=t.bool)
+        self.register_buffer('mask', mask, persistent=False)
 
-        probe_guess = t.tensor(probe_guess, dtype=t.complex64)
-        obj_guess = t.tensor(obj_guess, dtype=t.complex64)
+        # as_tensor avoids copying guesses which are already complex64
+        # tensors. Anything which ends up as a Parameter is copied once
+        # below, so the caller's arrays are never updated in place.
+        probe_guess = t.as_tensor(probe_guess, dtype=t.complex64)
+        obj_guess = t.as_tensor(obj_guess, dtype=t.complex64)
 
         # We rescale the probe here so it learns at the same rate as the
         # object
         if probe_guess.dim() > 3:
-            self.probe_norm = 1 * t.max(t.abs(probe_guess[0]))
+            probe_norm = 1 * t.max(t.abs(probe_guess[0]))
         else:
-            self.probe_norm = 1 * t.max(t.abs(probe_guess))
+            probe_norm = 1 * t.max(t.abs(probe_guess))
+        self.register_buffer('probe_norm', probe_norm, persistent=False)
 
         pg = probe_guess / self.probe_norm
         self.probe_real = t.nn.Parameter(pg.real)
         self.probe_imag = t.nn.Parameter(pg.imag)
 
-        self.obj_real = t.nn.Parameter(obj_guess.real)
-        self.obj_imag = t.nn.Parameter(obj_guess.imag)
+        self.obj_ri = t.nn.Parameter(t.view_as_real(obj_guess).clone())
 
         #self.probe = t.nn.Parameter(probe_guess.to(t.complex64)
         #                            / self.probe_norm)
@@ -105,9 +110,10 @@ class Multislice2DPtycho(CDIModel):
         if background is None:
             if detector_slice is not None:
                 background = 1e-6 * t.ones(
-                    self.probe[0][self.detector_slice].shape, dtype=t.float32)
+                    self.probe_real[0][self.detector_slice].shape,
+                    dtype=t.float32)
             else:
-                background = 1e-6 * t.ones(self.probe[0].shape,
+                background = 1e-6 * t.ones(self.probe_real[0].shape,
                                            dtype=t.float32)
 
         self.background = t.nn.Parameter(background)
@@ -119,38 +125,53 @@ class Multislice2DPtycho(CDIModel):
             # weights and complex-valued per-mode weight matrices
             if len(weights.shape) == 1:
                 # This is if it's just a list of numbers
-                self.weights = t.nn.Parameter(t.tensor(weights,
-                                                       dtype=t.float32))
+                self.weights = t.nn.Parameter(t.as_tensor(weights).to(
+                    dtype=t.float32, copy=True))
             else:
                 # Now this is a matrix of weights, so it needs to be complex
-                self.weights = t.nn.Parameter(t.tensor(weights,
-                                                       dtype=t.complex64))
+                self.weights = t.nn.Parameter(t.as_tensor(weights).to(
+                    dtype=t.complex64, copy=True))
 
         if translation_offsets is None:
             self.translation_offsets = None
         else:
-            t_o = t.tensor(translation_offsets, dtype=t.float32)
+            t_o = t.as_tensor(translation_offsets, dtype=t.float32)
             t_o = t_o / translation_scale
             self.translation_offsets = t.nn.Parameter(t_o)
 
         self.translation_scale = translation_scale
 
         if probe_support is not None:
-            self.probe_support = t.tensor(probe_support, dtype=t.bool)
-        else:
-            self.probe_support = None
+            probe_support = t.as_tensor(probe_support, dtype=t.bool)
+        self.register_buffer('probe_support', probe_support,
+                             persistent=False)
 
         self.oversampling = oversampling
 
         spacing = np.linalg.norm(self.probe_basis, axis=0)
-        shape = np.array(self.probe.shape[1:])
+        shape = np.array(self.probe_real.shape[1:])
         if prevent_aliasing:
             shape *= 2
             spacing /= 2
 
         self.bandlimit = bandlimit
 
-        self.as_prop = tools.propagators.generate_angular_spectrum_propagator(shape, spacing, self.wavelength, self.dz, self.bandlimit)
+        self.register_buffer(
+            'as_prop',
+            tools.propagators.generate_angular_spectrum_propagator(
+                shape, spacing, self.wavelength, self.dz, self.bandlimit),
+            persistent=False)
+
+
+    def _load_from_state_dict(self, state_dict, prefix, *args, **kwargs):
+        # Older versions stored the real and imaginary parts of the object
+        # as two separate parameters, so we merge them if we find them
+        real_key, imag_key = prefix + 'obj_real', prefix + 'obj_imag'
+        if real_key in state_dict and imag_key in state_dict:
+            state_dict[prefix + 'obj_ri'] = t.stack(
+                [state_dict.pop(real_key), state_dict.pop(imag_key)], dim=-1)
+
+        super()._load_from_state_dict(state_dict, prefix, *args, **kwargs)
 
 
     @classmethod
@@ -351,7 +372,7 @@ class Multislice2DPtycho(CDIModel):
         exit_waves = self.probe_norm * prs
         for i in range(self.nz):
             # If only one object slice
-            if self.obj.dim() == 2:
+            if obj.dim() == 2:
                 if i == 0 and self.subpixel:
                     # We only need to apply the subpixel shift to the first
                     # slice, because it shifts the probe
@@ -364,7 +385,7 @@ class Multislice2DPtycho(CDIModel):
                         multiple_modes=True,upsample_obj=self.prevent_aliasing)
                                         
                     
-            elif self.obj.dim() == 3:
+            elif obj.dim() == 3:
                 # If separate slices
                 if i == 0 and self.subpixel:
                     exit_waves = tools.interactions.ptycho_2D_sinc(
@@ -391,9 +412,9 @@ class Multislice2DPtycho(CDIModel):
         
     def forward_propagator(self, wavefields):
         if self.prevent_aliasing:
-            left = [self.probe.shape[-2]//2,self.probe.shape[-1]//2]
-            right = [self.probe.shape[-2]//2+self.probe.shape[-2],
-                     self.probe.shape[-1]//2+self.probe.shape[-1]]
+            left = [self.probe_real.shape[-2]//2,self.probe_real.shape[-1]//2]
+            right = [self.probe_real.shape[-2]//2+self.probe_real.shape[-2],
+                     self.probe_real.shape[-1]//2+self.probe_real.shape[-1]]
             
             return tools.propagators.far_field(wavefields)[...,left[0]:right[0],
                                                            left[1]:right[1]]
@@ -415,31 +436,6 @@ class Multislice2DPtycho(CDIModel):
         #return tools.losses.poisson_nll(real_data, sim_data, mask=mask,eps=0.5)
 
     
-    def to(self, *args, **kwargs):
-        super(Multislice2DPtycho, self).to(*args, **kwargs)
-        self.wavelength = self.wavelength.to(*args,**kwargs)
-        # move the detector geometry too
-        det_geo = self.detector_geometry
-        if hasattr(det_geo, 'distance'):
-            det_geo['distance'] = det_geo['distance'].to(*args,**kwargs)
-        if hasattr(det_geo, 'basis'):
-            det_geo['basis'] = det_geo['basis'].to(*args,**kwargs)
-        if hasattr(det_geo, 'corner'):
-            det_geo['corner'] = det_geo['corner'].to(*args,**kwargs)
-
-        if self.mask is not None:
-            self.mask = self.mask.to(*args, **kwargs)
-            
-        self.min_translation = self.min_translation.to(*args,**kwargs)
-        self.probe_basis = self.probe_basis.to(*args,**kwargs)
-        self.probe_norm = self.probe_norm.to(*args,**kwargs)
-        if self.probe_support is not None:
-            self.probe_support = self.probe_support.to(*args,**kwargs)
-                
-        
-        self.surface_normal = self.surface_normal.to(*args, **kwargs)
-        self.as_prop = self.as_prop.to(*args, **kwargs)
-        
     def sim_to_dataset(self, args_list):
         # In the future, potentially add more control
         # over what metadata is saved (names, etc.)
@@ -461,7 +457,7 @@ class Multislice2DPtycho(CDIModel):
                        'orientation': orientation}
 
         
-        detector_geometry = self.detector_geometry
+        detector_geometry = self.get_detector_geometry()
         mask = self.mask
         wavelength = self.wavelength
         indices, translations = args_list
@@ -479,7 +475,8 @@ class Multislice2DPtycho(CDIModel):
 
     
     def corrected_translations(self,dataset):
-        translations = dataset.translations.to(dtype=self.probe.real.dtype,device=self.probe.device)
+        translations = dataset.translations.to(
+            dtype=self.probe_real.dtype, device=self.probe_real.device)
         t_offset = tools.interactions.pixel_to_translations(self.probe_basis,self.translation_offsets*self.translation_scale,surface_normal=self.surface_normal)
         return translations + t_offset
 
@@ -492,8 +489,8 @@ class Multislice2DPtycho(CDIModel):
             return rhos_out
         # This is the purely incoherent case
         else:
-            return np.array([np.eye(self.probe.shape[0])]*self.weights.shape[0],
-                            dtype=np.complex64)
+            return np.array([np.eye(self.probe_real.shape[0])]
+                            * self.weights.shape[0], dtype=np.complex64)
 
     def tidy_probes(self):
         """Tidies up the probes
@@ -515,7 +512,6 @@ class Multislice2DPtycho(CDIModel):
         # First we treat the incoherent but stable  case, where the weights are
         # just one per-shot overall weight
         if self.weights.dim() == 1:
-            probe = self.probe.detach().cpu().numpy()
             ortho_probes = analysis.orthogonalize_probes(self.probe.detach())
             self.probe.data = ortho_probes
             return
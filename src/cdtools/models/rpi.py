@@ -4,7 +4,7 @@ from cdtools import tools
 from cdtools.tools import plotting as p
 from cdtools.tools.interactions import RPI_interaction
 from cdtools.tools import initializers
-from scipy.ndimage import binary_dilation
+from torch.nn.functional import max_pool2d
 import numpy as np
 from copy import copy
 import time
@@ -126,11 +126,13 @@ class RPI(CDIModel):
         self.register_buffer('background',
                              t.as_tensor(background, dtype=t.float32))
 
+        # The support is stored as a boolean mask, which is all it needs
+        # to be, because it gets read on every call to interaction
         if obj_support is None:
-            obj_support = t.ones_like(self.obj[0, ...], dtype=int)
+            obj_support = t.ones_like(self.obj[0, ...], dtype=t.bool)
 
         self.register_buffer('obj_support',
-                             t.as_tensor(obj_support, dtype=int))
+                             t.as_tensor(obj_support, dtype=t.bool))
         
         self.obj.data = self.obj * self.obj_support[None, ...]
         
@@ -173,13 +175,8 @@ class RPI(CDIModel):
         det_shape = dataset[0][1].shape
         distance = dataset.detector_geometry['distance']
 
-        # always do this on the cpu
-        get_as_args = dataset.get_as_args
-        dataset.get_as(device='cpu')
-        
-        # We only need the patterns here, not the inputs associated with them.
-        _, patterns = dataset[:]
-        dataset.get_as(*get_as_args[0],**get_as_args[1])
+        # Note that we don't need to load the full stack of patterns here,
+        # the object is only initialized from the first one, below
             
         # Then, generate the probe geometry from the dataset
         ewg = tools.initializers.exit_wave_geometry
@@ -234,7 +231,11 @@ class RPI(CDIModel):
 
         # This defines an object support in real space using the probe
         # intensities, if requested
-        probe_intensity = t.sqrt(t.sum(t.abs(probe)**2,axis=0))
+        if probe.is_complex():
+            probe_power = probe.real**2 + probe.imag**2
+        else:
+            probe_power = probe**2
+        probe_intensity = t.sqrt(t.sum(probe_power, axis=0))
         probe_fft = tools.propagators.far_field(probe_intensity)
         pad0l = (probe.shape[-2] - obj_size[-2])//2
         pad0r = probe.shape[-2] - obj_size[-2] - pad0l
@@ -244,7 +245,14 @@ class RPI(CDIModel):
         probe_lr = t.abs(tools.propagators.inverse_far_field(probe_lr_fft))
 
         obj_support = probe_lr > t.max(probe_lr) * probe_threshold
-        obj_support = t.as_tensor(binary_dilation(obj_support))
+
+        # We dilate the support by one pixel. This uses the same cross-shaped
+        # structuring element as scipy's binary_dilation, but stays in torch
+        support = obj_support[None, None].to(dtype=t.float32)
+        obj_support = t.maximum(
+            max_pool2d(support, (3, 1), stride=1, padding=(1, 0)),
+            max_pool2d(support, (1, 3), stride=1, padding=(0, 1)),
+        )[0, 0] > 0
 
         rpi_object = cls(wavelength, det_geo, ew_basis,
                          probe, dummy_init_obj, 
@@ -412,9 +420,13 @@ class RPI(CDIModel):
         n_modes, obj_shape = self.get_obj_shape_and_n_modes(
             obj_shape=obj_shape, n_modes=n_modes)
         
-        obj_guess = t.exp(
-            2j * np.pi * t.rand([n_modes,]+list(obj_shape))).to(
-                dtype=self.probe.dtype, device=self.probe.device)
+        # The random phases are drawn directly on the probe's device, and
+        # turned into unit-amplitude complex numbers with polar, which
+        # skips the real exponential a complex exp would also compute
+        phase = 2 * np.pi * t.rand([n_modes,]+list(obj_shape),
+                                   device=self.probe.device)
+        obj_guess = t.polar(t.ones_like(phase), phase).to(
+            dtype=self.probe.dtype)
 
         if hasattr(self, 'obj'):
             self.obj.data = obj_guess
@@ -456,8 +468,6 @@ class RPI(CDIModel):
         # This makes it seamless to use such a dataset even though those
         # extra arguments will not be used.
         
-        all_exit_waves = []
-
         # Mix the probes with the weight matrix
         prs = t.sum(self.weights[..., None, None] * self.probe, axis=-3)
 
@@ -469,28 +479,26 @@ class RPI(CDIModel):
         else:
             obj = self.obj
 
-        
-        for i in range(self.probe.shape[0]):
-            pr = prs[i]
-            # Here we have a 3D probe (one single mode)
-            # and a 4D object (multiple modes mixing incoherently)
-            exit_waves = RPI_interaction(pr,
-                                         self.obj_support * obj)
-                
-            all_exit_waves.append(exit_waves)
+
+        # We give each probe mode its own object mode axis, so a single
+        # call upsamples the object once and broadcasts it over all the
+        # probe modes, instead of looping over the probe modes
+        exit_waves = RPI_interaction(prs[:, None, :, :],
+                                     self.obj_support * obj)
 
         # This creates a bunch of modes generated from all possible combos
         # of the probe and object modes all strung out along the first index
-        output = t.cat(all_exit_waves)
+        output = exit_waves.reshape(-1, *exit_waves.shape[-2:])
         # If we have multiple indexes input, we unsqueeze and repeat the stack
         # of wavefields enough times to simulate each requested index. This
         # seems silly, but it enables (for example) one to do a reconstruction
         # from a set of diffraction patterns that are all known to be from the
-        # same object.
+        # same object. We use expand rather than repeat, so the repeated
+        # stack is only a view and is never copied in memory.
         try:
             # will fail if index has no length, for example when index
             # is just an int. In this case, we just do nothing instead
-            output = output.unsqueeze(0).repeat(1,len(index),1,1,1)
+            output = output.expand(1, len(index), *output.shape)
         except TypeError:
             pass
         return output
@@ -506,9 +514,9 @@ class RPI(CDIModel):
 
     
     def measurement(self, wavefields):
-        # Here I'm taking advantage of an undocumented feature in the
-        # incoherent_sum measurement function where it will work with
-        # a 4D wavefield array as well as a 5D array.
+        # The incoherent_sum measurement function sums over the (-3)
+        # index and accepts any number of leading dimensions, so it works
+        # with the 4D or 5D wavefield arrays from interaction as-is.
         m = tools.measurements.quadratic_background(
             wavefields,
             self.background,
@@ -521,11 +529,13 @@ class RPI(CDIModel):
         return tools.losses.amplitude_mse(real_data, sim_data, mask=mask)
 
     def regularizer(self, factors):
-        if self.obj.shape[0] == 1:
-            return factors[0] * t.sum(t.abs(self.obj[0,:,:])**2)
+        obj = self.obj
+        top_power = t.sum(obj[0].real**2 + obj[0].imag**2)
+        if obj.shape[0] == 1:
+            return factors[0] * top_power
         else:
-            return factors[0] * t.sum(t.abs(self.obj[0,:,:])**2) \
-                + factors[1] * t.sum(t.abs(self.obj[1:,:,:])**2)
+            return factors[0] * top_power \
+                + factors[1] * t.sum(obj[1:].real**2 + obj[1:].imag**2)
         
 
     def sim_to_dataset(self, args_list):
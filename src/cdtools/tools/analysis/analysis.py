@@ -6,8 +6,10 @@ on the attributes of the models themselves, or after-the-fact once the
 data has been stored in numpy arrays.
 """
 
+import math
 import torch as t
 import numpy as np
+from functools import lru_cache
 from cdtools.tools import image_processing as ip
 import cdtools
 from scipy import linalg as sla
@@ -36,7 +38,32 @@ __all__ = [
 ]
 
 
-def product_svd(A, B):
+def _abs2(x):
+    """Returns the squared magnitude of a real or complex tensor
+
+    For complex tensors, this avoids the square root taken by t.abs
+    """
+    if x.is_complex():
+        return x.real**2 + x.imag**2
+    return x**2
+
+
+def _sum_abs2(x, dim):
+    """Returns the sum of the squared magnitude of a tensor over dim
+
+    For complex tensors, this squares a real view of the tensor and sums
+    over the real and imaginary parts together, which avoids building
+    separate tensors for each part. dim must be a tuple of dimensions
+    """
+    if x.is_complex():
+        # The real view has an extra final dimension, so negative
+        # dimensions are shifted by one
+        x = t.view_as_real(x.resolve_conj())
+        dim = tuple(d - 1 if d < 0 else d for d in dim) + (-1,)
+    return t.sum(x**2, dim=dim)
+
+
+def product_svd(A, B, compute_u=True):
     """ Computes the SVD of A @ B
 
     This function uses a method which uses a QR decomposition of
@@ -44,17 +71,24 @@ def product_svd(A, B):
     calculating the full matrix. The output is defined such that
     A B = U S Vh, and as a reduced SVD
 
+    If compute_u is False, the left singular vectors are not calculated.
+    The Q factor of A only enters into those, so it is never built, which
+    saves time and memory when A is very tall.
+
     Parameters
     ----------
     A : array
         An nxr matrix
     B : array
         An rxm matrix
+    compute_u : bool
+        Default is True, whether to calculate the left singular vectors
 
     Returns
     -------
     U : array
-        An nxr matrix of left singular vectors
+        An nxr matrix of left singular vectors, or None if compute_u is
+        False
     S : array
         An length-r array, t.diag(S) is the diagonal matrix of singular values
     Vh : array
@@ -70,7 +104,10 @@ def product_svd(A, B):
         return_np = True
 
     # We take a QR decomposition of the two matrices
-    Qa, Ra = t.linalg.qr(A)
+    if compute_u:
+        Qa, Ra = t.linalg.qr(A)
+    else:
+        Ra = t.linalg.qr(A, mode='r')[1]
     Qb, Rb = t.linalg.qr(B.conj().transpose(0,1))
 
     # And now we take the SVD of the product of the two R matrices
@@ -78,11 +115,12 @@ def product_svd(A, B):
                             full_matrices=False)
 
     # And build back the final SVD of the product matrix
-    U_final = t.matmul(Qa, U)
+    U_final = t.matmul(Qa, U) if compute_u else None
     Vh_final = t.matmul(Vh, Qb.conj().transpose(0,1))
 
     if return_np:
-        U_final = U_final.numpy()
+        if compute_u:
+            U_final = U_final.numpy()
         S = S.numpy()
         Vh_final = Vh_final.numpy()
     
@@ -163,19 +201,24 @@ def orthogonalize_probes(
     if weight_matrix is None:
         # We just calculate a straight up SVD of the probes
         U, S, Vh = t.linalg.svd(probes_mat, full_matrices=False)
-        
+
     else:
-        U, S, Vh = product_svd(weight_matrix, probes_mat)
+        # The left singular vectors are only needed for the re-expressed
+        # weights, and skipping them avoids a QR decomposition of the
+        # (potentially very tall) weight matrix
+        U, S, Vh = product_svd(weight_matrix, probes_mat,
+                               compute_u=return_reexpressed_weights)
 
     output_shape = (-1,) + tuple(n for n in probes.shape[1:])
     orthogonalized_probes = (S[:,None] * Vh).reshape(output_shape)
-    reexpressed_weight_matrix = U
 
     if return_np:
         orthogonalized_probes = orthogonalized_probes.numpy()
-        reexpressed_weight_matrix = reexpressed_weight_matrix.numpy()
 
     if return_reexpressed_weights:
+        reexpressed_weight_matrix = U
+        if return_np:
+            reexpressed_weight_matrix = reexpressed_weight_matrix.numpy()
         return orthogonalized_probes, reexpressed_weight_matrix
     else:
         return orthogonalized_probes
@@ -241,42 +284,14 @@ def standardize(probe, obj, obj_slice=None, correct_ramp=False):
     else:
         single_probe = False
 
-    normalization = t.sqrt(t.mean(t.abs(probe[0])**2))
-    probe = probe / normalization
-    obj = obj * normalization
-
     # Default slice of the object to use for alignment, etc.
     if obj_slice is None:
         obj_slice = np.s_[(obj.shape[0]//8)*3:(obj.shape[0]//8)*5,
                           (obj.shape[1]//8)*3:(obj.shape[1]//8)*5]
 
-
-    if correct_ramp:
-        # Need to check if this is actually working and, if not, why not
-        center_freq = ip.centroid(t.abs(t.fft.fftshift(t.fft.fft2(probe[0]),
-                                                       dim=(-1,-2)))**2)
-        center_freq -= t.div(t.tensor(probe[0].shape,dtype=t.float32),2,rounding_mode='floor')
-        center_freq /= t.as_tensor(probe[0].shape,dtype=t.float32)
-
-        Is, Js = np.mgrid[:probe[0].shape[0],:probe[0].shape[1]]
-        probe_phase_ramp = t.exp(2j * np.pi *
-                                 (center_freq[0] * t.tensor(Is).to(t.float32) +
-                                  center_freq[1] * t.tensor(Js).to(t.float32)))
-        probe = probe *  t.conj(probe_phase_ramp)
-        Is, Js = np.mgrid[:obj.shape[0],:obj.shape[1]]
-        obj_phase_ramp = t.exp(2j*np.pi *
-                               (center_freq[0] * t.tensor(Is).to(t.float32) +
-                                center_freq[1] * t.tensor(Js).to(t.float32)))
-        obj = obj * obj_phase_ramp
-
-    # Then, we set them to consistent absolute phases
-
-    obj_angle = t.angle(t.sum(obj[obj_slice]))
-    obj = obj *  t.exp(-1j*obj_angle)
-
-    for i in range(probe.shape[0]):
-        probe_angle = t.angle(t.sum(probe[i]))
-        probe[i] = probe[i] * t.exp(-1j*probe_angle)
+    probe, obj = _standardize_stack(probe[None], obj[None], obj_slice,
+                                    correct_ramp)
+    probe, obj = probe[0], obj[0]
 
     if single_probe:
         probe = probe[0]
@@ -290,6 +305,72 @@ def standardize(probe, obj, obj_slice=None, correct_ramp=False):
 
 
 
+def _standardize_stack(probes, objs, obj_slice, correct_ramp):
+    """Standardizes a stack of probes and objects all at once
+
+    This implements standardize for a stack of R reconstructions, so the
+    normalizations, FFTs and phase ramps for the full set are each done
+    with a single call. See standardize for the details.
+
+    Parameters
+    ----------
+    probes : torch.Tensor
+        An RxLxNxM stack of complex probe mode stacks
+    objs : torch.Tensor
+        An RxN'xM' stack of complex objects
+    obj_slice : slice
+        A slice to take from each object for calculating normalizations
+    correct_ramp : bool
+        Whether to correct for the relative phase ramps
+
+    Returns
+    -------
+    standardized_probes : torch.Tensor
+        The standardized probes
+    standardized_objs : torch.Tensor
+        The standardized objects
+    """
+    # First, we normalize the probe intensity to a fixed value.
+    normalization = t.sqrt(t.mean(_abs2(probes[:,0]), dim=(-2,-1)))
+    probes = probes / normalization[:,None,None,None]
+    objs = objs * normalization[:,None,None]
+
+    if correct_ramp:
+        # Need to check if this is actually working and, if not, why not
+        probe_shape = t.as_tensor(probes.shape[-2:], dtype=t.float32)
+        center_freq = ip.centroid(_abs2(t.fft.fftshift(t.fft.fft2(probes[:,0]),
+                                                       dim=(-1,-2))))
+        center_freq -= t.div(probe_shape,2,rounding_mode='floor')
+        center_freq /= probe_shape
+
+        # The phase ramps are separable, so we only need to exponentiate
+        # along each axis once, over the longer of the probe and object,
+        # and the ramps for both are then outer products of slices of these
+        n_i = max(probes.shape[-2], objs.shape[-2])
+        n_j = max(probes.shape[-1], objs.shape[-1])
+        Is = t.arange(n_i, dtype=t.float32, device=objs.device)
+        Js = t.arange(n_j, dtype=t.float32, device=objs.device)
+        i_ramp = t.exp(2j * np.pi * center_freq[:,0,None] * Is)
+        j_ramp = t.exp(2j * np.pi * center_freq[:,1,None] * Js)
+
+        def phase_ramp(shape):
+            return i_ramp[:,:shape[0],None] * j_ramp[:,None,:shape[1]]
+
+        probes = probes * t.conj(phase_ramp(probes.shape[-2:]))[:,None]
+        objs = objs * phase_ramp(objs.shape[-2:])
+
+    # Then, we set them to consistent absolute phases
+    if not isinstance(obj_slice, tuple):
+        obj_slice = (obj_slice,)
+    obj_angles = t.angle(t.sum(objs[(np.s_[:],) + obj_slice], dim=(-2,-1)))
+    objs = objs * t.exp(-1j*obj_angles)[:,None,None]
+
+    probe_angles = t.angle(t.sum(probes, dim=(-2,-1)))
+    probes = probes * t.exp(-1j*probe_angles)[...,None,None]
+
+    return probes, objs
+
+
 def synthesize_reconstructions(probes, objects, use_probe=False, obj_slice=None, correct_ramp=False):
     """Takes a collection of reconstructions and outputs a single synthesized probe and object
 
@@ -341,12 +422,21 @@ def synthesize_reconstructions(probes, objects, use_probe=False, obj_slice=None,
 
 
 
-    synth_probe, synth_obj = standardize(probes[0].clone(), objects[0].clone(), obj_slice=obj_slice,correct_ramp=correct_ramp)
+    # The full set of reconstructions is standardized in one go
+    probe_stack = t.stack(probes)
+    if probe_stack.dim() == 3:
+        probe_stack = probe_stack[:,None]
+    probe_stack, object_stack = _standardize_stack(
+        probe_stack, t.stack(objects), obj_slice, correct_ramp)
+    if probes[0].dim() == 2:
+        probe_stack = probe_stack[:,0]
+    probes, objects = t.unbind(probe_stack), t.unbind(object_stack)
+
+    synth_probe, synth_obj = probes[0], objects[0]
 
     obj_stack = [synth_obj]
 
     for i, (probe, obj) in enumerate(zip(probes[1:],objects[1:])):
-        probe, obj = standardize(probe.clone(), obj.clone(), obj_slice=obj_slice,correct_ramp=correct_ramp)
         if use_probe:
             shift = ip.find_shift(synth_probe[0],probe[0], resolution=50)
         else:
@@ -355,11 +445,8 @@ def synthesize_reconstructions(probes, objects, use_probe=False, obj_slice=None,
 
         obj = ip.sinc_subpixel_shift(obj,np.array(shift))
 
-        if len(probe.shape) == 3:
-            probe = t.stack([ip.sinc_subpixel_shift(p,tuple(shift))
-                             for p in probe],dim=0)
-        else:
-            probe = ip.sinc_subpixel_shift(probe,tuple(shift))
+        # This shifts all the probe modes at once, if there are several
+        probe = ip.sinc_subpixel_shift(probe,tuple(shift))
 
         synth_probe = synth_probe + probe
         synth_obj = synth_obj + obj
@@ -382,6 +469,228 @@ def synthesize_reconstructions(probes, objects, use_probe=False, obj_slice=None,
 
 
 
+def _radial_bins(Rs, nbins, hist_range=None):
+    """Finds the histogram bin of every pixel in a map of radii
+
+    This matches the binning of np.histogram, but it is only done once, so
+    several weighted histograms over the same radii can be accumulated
+    with _binned_sum without repeating the binning.
+
+    Parameters
+    ----------
+    Rs : array
+        The radii to bin
+    nbins : int
+        The number of bins
+    hist_range : tuple
+        Optional, the (lower, upper) range of the bins. Defaults to the
+        full range of Rs
+
+    Returns
+    -------
+    bins : array
+        The nbins+1 bin edges
+    indices : array
+        The bin index for each radius which falls within the range
+    keep : array
+        A flattened mask of the radii which fall within the range
+    """
+    Rs = np.ravel(Rs)
+    if hist_range is None:
+        hist_range = (np.min(Rs), np.max(Rs))
+    bins = np.linspace(hist_range[0], hist_range[1], nbins + 1)
+
+    keep = (Rs >= bins[0]) & (Rs <= bins[-1])
+    kept = Rs[keep]
+    indices = ((kept - bins[0]) * (nbins / (bins[-1] - bins[0])))
+    indices = indices.astype(np.intp)
+    indices[indices == nbins] -= 1
+
+    # This corrects for any rounding errors at the bin edges, in the same
+    # way as np.histogram
+    indices[kept < bins[indices]] -= 1
+    indices[(kept >= bins[indices + 1]) & (indices != nbins - 1)] += 1
+
+    return bins, indices, keep
+
+
+def _binned_sum(indices, keep, nbins, weights=None):
+    """Sums a set of weights into the bins found by _radial_bins
+
+    Any dimensions of the weights before the final two are treated as a
+    stack of images, which are all binned with a single call.
+    """
+    if weights is None:
+        return np.bincount(indices, minlength=nbins)
+
+    weights = np.asarray(weights)
+    stack_shape = weights.shape[:-2]
+    weights = weights.reshape(-1, keep.size)[:,keep]
+
+    # Each image in the stack gets its own set of bins
+    n_stack = weights.shape[0]
+    stack_indices = (indices + nbins * np.arange(n_stack)[:,None]).ravel()
+
+    def bincount(w):
+        return np.bincount(stack_indices, weights=w.ravel(),
+                           minlength=n_stack * nbins)
+
+    if np.iscomplexobj(weights):
+        binned = bincount(weights.real) + 1j * bincount(weights.imag)
+    else:
+        binned = bincount(weights)
+    return binned.astype(weights.dtype).reshape(stack_shape + (nbins,))
+
+
+@lru_cache(maxsize=16)
+def _frequency_bins(shape, di, dj, nbins, limit=None):
+    """Bins the spatial frequencies of an image by their radius
+
+    The result only depends on the image shape and pixel spacing, so it is
+    cached and reused when many images of the same shape are compared.
+    The returned arrays are shared between calls, so they are made
+    read-only.
+
+    Parameters
+    ----------
+    shape : tuple
+        The shape of the images
+    di : float
+        The pixel spacing along the first axis
+    dj : float
+        The pixel spacing along the second axis
+    nbins : int
+        The number of bins
+    limit : str
+        Optional, 'side' or 'corner', the highest frequency to bin up to.
+        By default, the full range of radii is used
+
+    Returns
+    -------
+    bins : array
+        The nbins+1 bin edges
+    indices : array
+        The bin index for each frequency which falls within the range
+    keep : array
+        A flattened mask of the frequencies which fall within the range
+    """
+    Rs, hist_range = _frequency_radii(shape, di, dj, limit)
+    results = _radial_bins(Rs, nbins, hist_range)
+    for result in results:
+        result.flags.writeable = False
+    return results
+
+
+@lru_cache(maxsize=16)
+def _frequency_rings(shape, di, dj, nbins, limit, device, onesided=False):
+    """Groups the spatial frequencies of an image into rings by radius
+
+    Ring i covers the radii bins[i] <= R < bins[i+1], with the bin edges
+    chosen in the same way as np.histogram. The pixel ordering indexes
+    into the unshifted output of an FFT, so no fftshift is needed before
+    gathering the rings. Like _frequency_bins, this is cached, and the
+    returned arrays are shared between calls.
+
+    If onesided is True, the ordering instead indexes into the output of
+    an rfft2, which only stores half of the spectrum of a real image. The
+    pixels standing in for a mirrored pair are then given a weight of 2.
+
+    Parameters
+    ----------
+    shape : tuple
+        The shape of the images
+    di : float
+        The pixel spacing along the first axis
+    dj : float
+        The pixel spacing along the second axis
+    nbins : int
+        The number of rings
+    limit : str
+        'side' or 'corner', the highest frequency to bin up to
+    device : torch.device
+        The device to store the pixel ordering on
+    onesided : bool
+        Default is False, whether to index into the output of an rfft2
+
+    Returns
+    -------
+    bins : array
+        The nbins+1 bin edges
+    n_pix : array
+        The number of pixels in each bin, as counted by np.histogram
+    order : torch.Tensor
+        The flattened indices of the pixels in all the rings, sorted by ring
+    counts : tuple
+        The number of pixels in each ring
+    rings : torch.Tensor
+        The ring that each pixel falls in, in the same order as the pixels
+    sqrt_weights : torch.Tensor
+        For onesided rings, the square roots of the pixel weights, in the
+        same order as the pixels. None otherwise
+    """
+    Rs, frc_range = _frequency_radii(shape, di, dj, limit)
+
+    # This is used to get a set of bins that matches the logic used by
+    # np.histogram, so that this function will match the choices of bin
+    # edges that comes from the non-generalized version. This also gets
+    # us the count on the number of pixels per bin so we can calculate
+    # the threshold curve
+    n_pix, bins = np.histogram(Rs, bins=nbins, range=frc_range)
+
+    # Rs is laid out like an fftshifted spectrum, so we undo the shift
+    # here rather than shifting the spectra themselves
+    Rs = np.fft.ifftshift(Rs)
+    if onesided:
+        n_cols = shape[1] // 2 + 1
+        Rs = Rs[:,:n_cols]
+        # Every column but the zero frequency and, for even sizes, the
+        # Nyquist frequency stands in for its mirror image as well
+        weights = np.full(Rs.shape, 2.)
+        weights[:,0] = 1
+        if shape[1] % 2 == 0:
+            weights[:,-1] = 1
+
+    # Each pixel is labeled with the ring it falls in, and pixels outside
+    # all the rings are dropped
+    ring_idx = np.searchsorted(bins, Rs.ravel(), side='right') - 1
+    in_rings = np.flatnonzero((ring_idx >= 0) & (ring_idx < nbins))
+    order = in_rings[np.argsort(ring_idx[in_rings], kind='stable')]
+    counts = tuple(np.bincount(ring_idx[order], minlength=nbins).tolist())
+
+    if onesided:
+        sqrt_weights = t.as_tensor(np.sqrt(weights.ravel()[order]),
+                                   device=device)
+    else:
+        sqrt_weights = None
+
+    bins.flags.writeable = False
+    n_pix.flags.writeable = False
+    return (bins, n_pix, t.as_tensor(order, device=device), counts,
+            t.as_tensor(ring_idx[order], device=device), sqrt_weights)
+
+
+def _frequency_radii(shape, di, dj, limit=None):
+    """Returns the radial spatial frequencies of an image, and their range
+
+    The range is set by limit, which is 'side' or 'corner', or None for
+    the full range of radii
+    """
+    i_freqs = np.fft.fftshift(np.fft.fftfreq(shape[0],d=di))
+    j_freqs = np.fft.fftshift(np.fft.fftfreq(shape[1],d=dj))
+
+    Js,Is = np.meshgrid(j_freqs,i_freqs)
+    Rs = np.sqrt(Is**2+Js**2)
+
+    if limit == 'side':
+        hist_range = [0, max(np.max(i_freqs), np.max(j_freqs))]
+    elif limit == 'corner':
+        hist_range = [0, np.max(Rs)]
+    else:
+        hist_range = None
+
+    return Rs, hist_range
+
+
 def calc_consistency_prtf(synth_obj, objects, basis, obj_slice=None,nbins=None):
     """Calculates a PRTF between each the individual objects and a synthesized one
 
@@ -429,32 +738,26 @@ def calc_consistency_prtf(synth_obj, objects, basis, obj_slice=None,nbins=None):
     if nbins is None:
         nbins = np.max(synth_obj[obj_slice].shape) // 4
 
-    synth_fft = (t.abs(t.fft.fftshift(t.fft.fft2(synth_obj[obj_slice]), dim=(-1,-2)))**2).numpy()
+    synth_fft = _abs2(t.fft.fftshift(t.fft.fft2(synth_obj[obj_slice]),
+                                     dim=(-1,-2))).numpy()
 
 
     di = np.linalg.norm(basis[:,0])
     dj = np.linalg.norm(basis[:,1])
 
-    i_freqs = np.fft.fftshift(np.fft.fftfreq(synth_fft.shape[0],d=di))
-    j_freqs = np.fft.fftshift(np.fft.fftfreq(synth_fft.shape[1],d=dj))
-
-    Js,Is = np.meshgrid(j_freqs,i_freqs)
-    Rs = np.sqrt(Is**2+Js**2)
-
-
-    synth_ints, bins = np.histogram(Rs,bins=nbins,weights=synth_fft)
-
-    prtfs = []
-    for obj in objects:
-        obj = obj[obj_slice]
-        single_fft = (t.abs(t.fft.fftshift(t.fft.fft2(obj),
-                                           dim=(-1,-2)))**2).numpy()
-        single_ints, bins = np.histogram(Rs,bins=nbins,weights=single_fft)
-
-        prtfs.append(synth_ints/single_ints)
+    # The radii are binned once, and reused for every object
+    bins, indices, keep = _frequency_bins(synth_fft.shape, di, dj, nbins)
+    bins = bins.copy()
+    synth_ints = _binned_sum(indices, keep, nbins, weights=synth_fft)
 
+    # All the single objects are transformed with one batched FFT
+    single_ffts = t.stack([obj[obj_slice] for obj in objects])
+    single_ffts = _abs2(t.fft.fftshift(t.fft.fft2(single_ffts),
+                                       dim=(-1,-2))).numpy()
 
-    prtf = np.mean(prtfs,axis=0)
+    # And their spectra are binned all at once too
+    single_ints = _binned_sum(indices, keep, nbins, weights=single_ffts)
+    prtf = np.mean(synth_ints / single_ints, axis=0)
 
     if not obj_np:
         bins = t.Tensor(bins)
@@ -472,6 +775,10 @@ def calc_deconvolved_cross_correlation(im1, im2, im_slice=None):
     kernel, whose characteristic size is related to the exactness of the
     possible alignment between the two images, on top of a random background
 
+    Frequencies where the product of the two spectra is exactly zero have
+    no defined phase. They are set to zero before the inverse transform,
+    so they drop out of the result instead of filling it with nans.
+
     Parameters
     ----------
     im1 : array
@@ -501,12 +808,28 @@ def calc_deconvolved_cross_correlation(im1, im2, im_slice=None):
                           (im1.shape[1]//8)*3:(im1.shape[1]//8)*5]
 
 
-    cor_fft = t.fft.fft2(im1[im_slice]) * \
-        t.conj(t.fft.fft2(im2[im_slice]))
+    im1, im2 = im1[im_slice], im2[im_slice]
+
+    # For real images, the spectra are Hermitian, so we only need to
+    # calculate half of them. The result is still returned as complex.
+    real_input = not (im1.is_complex() or im2.is_complex())
+    if real_input:
+        cor_fft = t.fft.rfft2(im1) * t.conj(t.fft.rfft2(im2))
+    else:
+        cor_fft = t.fft.fft2(im1) * t.conj(t.fft.fft2(im2))
 
     # Not sure if this is more or less stable than just the correlation
-    # maximum - requires some testing
-    cor = t.fft.ifft2(cor_fft / t.abs(cor_fft))
+    # maximum - requires some testing. The magnitude is calculated with
+    # t.abs, which doesn't overflow like the squared magnitude can, and the
+    # clamp only matters for bins which are exactly zero, which stay zero
+    magnitude = t.abs(cor_fft)
+    cor_fft = cor_fft / magnitude.clamp_min(t.finfo(magnitude.dtype).tiny)
+
+    if real_input:
+        cor = t.fft.irfft2(cor_fft, s=im1.shape[-2:])
+        cor = cor.to(dtype=t.promote_types(cor.dtype, t.complex64))
+    else:
+        cor = t.fft.ifft2(cor_fft)
 
     if im_np:
         cor = cor.numpy()
@@ -579,36 +902,28 @@ def calc_frc(im1, im2, basis, im_slice=None, nbins=None, snr=1., limit='side'):
     #p.plot_amplitude(t.log(t.abs(f1)))
     #p.plot_phase(cor_fft)
     #plt.show()
-    F1 = t.abs(f1)**2
-    F2 = t.abs(f2)**2
+    F1 = _abs2(f1)
+    F2 = _abs2(f2)
 
     # TODO this is still incorrect if the two bases arent equal
-    di = np.linalg.norm(basis[:,0])
-    dj = np.linalg.norm(basis[:,1])
-
-    i_freqs = np.fft.fftshift(np.fft.fftfreq(cor_fft.shape[0],d=di))
-    j_freqs = np.fft.fftshift(np.fft.fftfreq(cor_fft.shape[1],d=dj))
+    if not basis.is_floating_point():
+        basis = basis.to(dtype=t.float64)
+    di, dj = t.linalg.norm(basis[:,:2], dim=0).tolist()
 
-    Js,Is = np.meshgrid(j_freqs,i_freqs)
-    Rs = np.sqrt(Is**2+Js**2)
-
-    if limit.lower().strip() == 'side':
-        max_i = np.max(i_freqs)
-        max_j = np.max(j_freqs)
-        frc_range = [0, max(max_i,max_j)]
-
-    elif limit.lower().strip() == 'corner':
-        frc_range = [0, np.max(Rs)]
-    else:
+    limit = limit.lower().strip()
+    if limit not in ('side', 'corner'):
         raise ValueError('Invalid FRC limit: choose "side" or "corner"')
 
-    numerator, bins = np.histogram(Rs, bins=nbins, range=frc_range,
-                                   weights=cor_fft.numpy())
-    denominator_F1, bins = np.histogram(Rs, bins=nbins, range=frc_range,
-                                        weights=F1.detach().cpu().numpy())
-    denominator_F2, bins = np.histogram(Rs, bins=nbins, range=frc_range,
-                                        weights=F2.detach().cpu().numpy())
-    n_pix, bins = np.histogram(Rs, bins=nbins, range=frc_range)
+    # The radii are binned once, and reused for all four histograms
+    bins, indices, keep = _frequency_bins(tuple(cor_fft.shape), di, dj,
+                                          nbins, limit)
+    bins = bins.copy()
+    numerator = _binned_sum(indices, keep, nbins, weights=cor_fft.numpy())
+    denominator_F1 = _binned_sum(indices, keep, nbins,
+                                 weights=F1.detach().cpu().numpy())
+    denominator_F2 = _binned_sum(indices, keep, nbins,
+                                 weights=F2.detach().cpu().numpy())
+    n_pix = _binned_sum(indices, keep, nbins)
 
     
     #n_pix = n_pix / 4 # This is for an apodized image, apodized with a hann window
@@ -663,15 +978,14 @@ def calc_vn_entropy(matrix):
     """
 
     if len(matrix.shape) == 3:
-        # Get the eigenvalues
-        eigs = [np.linalg.eigh(mat)[0] for mat in matrix]
+        # Get the eigenvalues, for the full stack at once
+        eigs = np.linalg.eigvalsh(matrix)
         # Normalize them to match standard density matrix form
-        eigs = [eig / np.sum(eig) for eig in eigs]
+        eigs = eigs / np.sum(eigs, axis=-1, keepdims=True)
         # And calculate the VN entropy!
-        entropies = [-np.sum(special.xlogy(eig,eig)) for eig in eigs]
-        return np.array(entropies)
+        return -np.sum(special.xlogy(eigs,eigs), axis=-1)
     else:
-        eig = np.linalg.eigh(matrix)[0]
+        eig = np.linalg.eigvalsh(matrix)
         entropy = -np.sum(special.xlogy(eig,eig))/np.sum(eig)
         return entropy
 
@@ -722,7 +1036,7 @@ def calc_mode_power_fractions(
                                  axis=-(n_probe_dims + 1))
         
     dims = [-d-1 for d in range(n_probe_dims)]
-    power = t.sum(t.abs(ortho_probes)**2, dim=dims)
+    power = t.sum(_abs2(ortho_probes), dim=dims)
     power_fractions = power / t.sum(power)
     return power_fractions
 
@@ -792,13 +1106,13 @@ def calc_rms_error(field_1, field_2, align_phases=True, normalize=False,
         gamma = 1
 
     if normalize:
-        norm = 1 / t.mean(t.abs(field_1)**2, dim=sumdims)
+        norm = 1 / t.mean(_abs2(field_1), dim=sumdims)
     else:
         norm = 1
 
     difference = field_1 - gamma * field_2
     
-    return t.sqrt(norm * t.mean(t.abs(difference)**2, dim=sumdims))
+    return t.sqrt(norm * t.mean(_abs2(difference), dim=sumdims))
 
 
 def calc_fidelity(fields_1, fields_2, dims=2):
@@ -852,9 +1166,14 @@ def calc_fidelity(fields_1, fields_2, dims=2):
 
     fields_1 = t.as_tensor(fields_1)
     fields_2 = t.as_tensor(fields_2)
-    mult = fields_1.unsqueeze(-dims-2) * fields_2.unsqueeze(-dims-1).conj()
-    sumdims = tuple(d - dims for d in range(dims))
-    mat = t.sum(mult,dim=sumdims)
+    dtype = t.promote_types(fields_1.dtype, fields_2.dtype)
+
+    # We calculate the matrix of overlaps between the modes as a matrix
+    # product of the flattened fields, which avoids ever building the full
+    # stack of pairwise products of the modes in memory
+    flat_1 = fields_1.to(dtype=dtype).flatten(start_dim=-dims)
+    flat_2 = fields_2.to(dtype=dtype).flatten(start_dim=-dims)
+    mat = t.matmul(flat_1, flat_2.transpose(-1,-2).conj())
     # Because I think this is the nuclear norm squared, I would like to swap
     # Out the definition for this, but I need to test it before swapping.
     # It also probably makes sense to implement sqrt_fidelity separately
@@ -930,14 +1249,17 @@ def calc_generalized_rms_error(fields_1, fields_2, normalize=False, dims=2):
     fields_1 = t.as_tensor(fields_1)
     fields_2 = t.as_tensor(fields_2)
 
-    npix = t.prod(t.as_tensor(fields_1.shape[-dims:],dtype=t.int32))
+    npix = math.prod(fields_1.shape[-dims:])
     
     sumdims = tuple(d - dims - 1 for d in range(dims+1))
-    fields_1_intensity = t.sum(t.abs(fields_1)**2,dim=sumdims) / npix
-    fields_2_intensity = t.sum(t.abs(fields_2)**2,dim=sumdims) / npix
+    fields_1_intensity = _sum_abs2(fields_1, sumdims) / npix
+    fields_2_intensity = _sum_abs2(fields_2, sumdims) / npix
     fidelity = calc_fidelity(fields_1, fields_2, dims=dims) / npix**2
 
-    result = fields_1_intensity + fields_2_intensity - 2 * t.sqrt(fidelity)
+    # When the fields are nearly identical, rounding errors can leave
+    # this slightly negative, which would come out of the sqrt as a NaN
+    result = (fields_1_intensity + fields_2_intensity
+              - 2 * t.sqrt(fidelity)).clamp_min(0)
     
     if normalize:
         result /= fields_1_intensity
@@ -994,63 +1316,65 @@ def calc_generalized_frc(fields_1, fields_2, basis, im_slice=None, nbins=None, s
     if im_slice is None:
         im_slice = np.s_[...,:,:]
 
-    if nbins is None:
-        nbins = np.max(fields_1[...,im_slice].shape[-2:]) // 4
-
-
-    f1 = t.fft.fftshift(t.fft.fft2(fields_1[im_slice]),dim=(-1,-2))
-    f2 = t.fft.fftshift(t.fft.fft2(fields_2[im_slice]),dim=(-1,-2))
-    cor_fft = f1 * t.conj(f2)
-
-    F1 = t.abs(f1)**2
-    F2 = t.abs(f2)**2
-
-
-    di = np.linalg.norm(basis[:,0])
-    dj = np.linalg.norm(basis[:,1])
-
-    i_freqs = np.fft.fftshift(np.fft.fftfreq(cor_fft.shape[-2],d=di))
-    j_freqs = np.fft.fftshift(np.fft.fftfreq(cor_fft.shape[-1],d=dj))
+    # For real fields, the spectra are Hermitian, so we only need half
+    shape = tuple(fields_1[im_slice].shape[-2:])
+    onesided = not (fields_1.is_complex() or fields_2.is_complex())
+    if onesided:
+        f1 = t.fft.rfft2(fields_1[im_slice])
+        f2 = t.fft.rfft2(fields_2[im_slice])
+    else:
+        f1 = t.fft.fft2(fields_1[im_slice])
+        f2 = t.fft.fft2(fields_2[im_slice])
 
-    Js,Is = np.meshgrid(j_freqs,i_freqs)
-    Rs = np.sqrt(Is**2+Js**2)
+    if nbins is None:
+        nbins = np.max(shape) // 4
 
-    if limit.lower().strip() == 'side':
-        max_i = np.max(i_freqs)
-        max_j = np.max(j_freqs)
-        frc_range = [0, max(max_i,max_j)]
+    if not basis.is_floating_point():
+        basis = basis.to(dtype=t.float64)
+    di, dj = t.linalg.norm(basis[:,:2], dim=0).tolist()
 
-    elif limit.lower().strip() == 'corner':
-        frc_range = [0, np.max(Rs)]
-    else:
+    limit = limit.lower().strip()
+    if limit not in ('side', 'corner'):
         raise ValueError('Invalid FRC limit: choose "side" or "corner"')
 
-    # This line is used to get a set of bins that matches the logic
-    # used by np.histogram, so that this function will match the choices
-    # of bin edges that comes from the non-generalized version. This also
-    # gets us the count on the number of pixels per bin so we can calculate
-    # the threshold curve
-    n_pix, bins = np.histogram(Rs,bins=nbins, range=frc_range)
-    bins = t.as_tensor(bins)
-    Rs = t.as_tensor(Rs)
-
-    frc = []
-    for i in range(len(bins)-1):
-        mask = t.logical_and(Rs<bins[i+1], Rs>=bins[i])
-        masked_f1 = f1 * mask[...,:,:]
-        masked_f2 = f2 * mask[...,:,:]
-        numerator = t.sqrt(calc_fidelity(masked_f1, masked_f2))
-        denominator_f1 = t.sqrt(calc_fidelity(masked_f1, masked_f1))
-        denominator_f2 = t.sqrt(calc_fidelity(masked_f2, masked_f2))
-        frc.append(numerator / t.sqrt((denominator_f1 * denominator_f2)))
-
-    frc = np.array(frc)
+    bins, n_pix, order, counts, rings, sqrt_weights = _frequency_rings(
+        shape, di, dj, nbins, limit, f1.device, onesided=onesided)
+    bins = bins.copy()
+
+    # We gather the pixels of each ring into a contiguous block, so each
+    # ring's matrix of mode overlaps is a single small matrix product
+    ring_f1 = f1.flatten(start_dim=-2)[...,order]
+    ring_f2 = f2.flatten(start_dim=-2)[...,order]
+    if onesided:
+        ring_f1 = ring_f1 * sqrt_weights.to(dtype=f1.real.dtype)
+        ring_f2 = ring_f2 * sqrt_weights.to(dtype=f2.real.dtype)
+    overlaps = t.stack([t.matmul(r1, r2.transpose(-1,-2).conj())
+                        for r1, r2 in zip(t.split(ring_f1, counts, dim=-1),
+                                          t.split(ring_f2, counts, dim=-1))])
+    if onesided:
+        # Each mirrored pair of pixels contributes an overlap and its
+        # complex conjugate, so the full sum is the real part
+        overlaps = overlaps.real
+
+    # The square root of the fidelity is the nuclear norm of the overlap
+    # matrix. For the self-fidelities, the overlap matrices are positive
+    # semidefinite, so this is just the total power in each ring, which
+    # we sum over all the rings at once
+    numerator = t.sum(t.linalg.svdvals(overlaps), dim=-1)
+    power_f1 = _sum_abs2(ring_f1, (-2,)).movedim(-1,0)
+    power_f2 = _sum_abs2(ring_f2, (-2,)).movedim(-1,0)
+    denominator_f1 = power_f1.new_zeros((nbins,) + power_f1.shape[1:])
+    denominator_f1.index_add_(0, rings, power_f1)
+    denominator_f2 = power_f2.new_zeros((nbins,) + power_f2.shape[1:])
+    denominator_f2.index_add_(0, rings, power_f2)
+    frc = (numerator / t.sqrt(denominator_f1 * denominator_f2)).cpu().numpy()
 
     # This moves from combined-image SNR to single-image SNR
     snr /= 2
 
-    threshold = (snr + (2 * snr + 1) / np.sqrt(n_pix)) / \
-        (1 + snr + (2 * np.sqrt(snr)) / np.sqrt(n_pix))
+    inv_sqrt_n_pix = 1 / np.sqrt(n_pix)
+    threshold = (snr + (2 * snr + 1) * inv_sqrt_n_pix) / \
+        (1 + snr + 2 * np.sqrt(snr) * inv_sqrt_n_pix)
 
     if not im_np:
         bins = t.tensor(bins)
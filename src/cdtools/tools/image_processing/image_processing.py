@@ -75,9 +75,9 @@ def centroid_sq(im, dims=2, comp=False):
     By default, the last two dimensions are used in the calculation
     and the remainder of the dimensions are passed through.
 
-    If the "comp" flag is set, it will be assumed that the last dimension
-    represents the real and imaginary part of a complex number, and the
-    centroid will be calculated for the magnitude squared of those numbers
+    If the "comp" flag is set, it will be assumed that the image is
+    complex-valued, and the centroid will be calculated for the magnitude
+    squared of those numbers
 
     Parameters
     ----------
@@ -105,12 +105,15 @@ def sinc_subpixel_shift(im, shift):
     """Performs a subpixel shift with sinc interpolation on the given tensor
 
     The subpixel shift is done circularly via a multiplication with a linear
-    phase mask in Fourier space.
+    phase mask in Fourier space. The final two dimensions are shifted, and
+    any leading dimensions are treated as a stack of images which are all
+    shifted by the same amount.
 
     Parameters
     ----------
     im : torch.Tensor
-        A complex-valued tensor to perform the subpixel shift on
+        A complex-valued (Leading Dims)xNxM tensor to perform the subpixel
+        shift on
     shift : array
         A length-2 array describing the shift to perform, in pixels
 
@@ -120,11 +123,11 @@ def sinc_subpixel_shift(im, shift):
         The subpixel shifted tensor
     """
 
-    i = t.arange(im.shape[0]) - im.shape[0]//2
-    j = t.arange(im.shape[1]) - im.shape[1]//2
+    i = t.arange(im.shape[-2]) - im.shape[-2]//2
+    j = t.arange(im.shape[-1]) - im.shape[-1]//2
     I,J = t.meshgrid(i,j, indexing='ij')
-    I = 2 * np.pi * I.to(t.float32) / im.shape[0]
-    J = 2 * np.pi * J.to(t.float32) / im.shape[1]
+    I = 2 * np.pi * I.to(t.float32) / im.shape[-2]
+    J = 2 * np.pi * J.to(t.float32) / im.shape[-1]
     I = I.to(dtype=im.dtype,device=im.device)
     J = J.to(dtype=im.dtype,device=im.device)
 
@@ -156,12 +156,14 @@ def gaussian(shape, sigma, amplitude=1, center = None, curvature=[0,0]):
     if center is None:
         center = ((shape[0]-1)/2, (shape[1]-1)/2)
         
-    i, j = np.mgrid[:shape[0], :shape[1]]
-    isq = (i - center[0])**2
-    jsq = (j - center[1])**2
-    result = np.exp((1j*curvature[0] / 2 - 1 / (2 * sigma[0]**2)) * isq + \
-        (1j*curvature[1] / 2 - 1 / (2 * sigma[1]**2)) * jsq)
-    return t.as_tensor(amplitude*result,dtype=t.complex64)
+    # The gaussian is separable, so we only evaluate the exponential along
+    # each axis and then take the outer product
+    isq = (np.arange(shape[0]) - center[0])**2
+    jsq = (np.arange(shape[1]) - center[1])**2
+    i_factor = np.exp((1j*curvature[0] / 2 - 1 / (2 * sigma[0]**2)) * isq)
+    j_factor = np.exp((1j*curvature[1] / 2 - 1 / (2 * sigma[1]**2)) * jsq)
+    result = np.outer(amplitude * i_factor, j_factor)
+    return t.as_tensor(result,dtype=t.complex64)
 
 
 
@@ -236,8 +238,10 @@ def gaussian_probe(dataset, basis, shape, sigma, propagation_distance=0, polariz
         factors = [(math.cos(math.radians(polarizer[idx] - analyzer[idx])))**2 for idx in range(len(dataset)) if (abs(polarizer[idx] - analyzer[idx]) > 5)]
         avg_intensities = [t.sum(dataset[idx][1]) / factor[idx] for idx in range(len(dataset))]
 
-    avg_intensity = t.mean(t.tensor(avg_intensities))
-    probe_intensity = t.sum(t.abs(probe)**2)
+    # Stacking the per-pattern sums, rather than building a new tensor from
+    # the list, keeps them as tensors and avoids pulling each one to a float
+    avg_intensity = t.mean(t.stack(avg_intensities))
+    probe_intensity = t.sum(probe.real**2 + probe.imag**2)
     probe = t.sqrt(avg_intensity / probe_intensity) * probe
 
     if polarized:
@@ -267,18 +267,23 @@ def ptycho_2D_round(probe, obj, translations, multiple_modes=False, upsample_obj
 
     integer_translations = t.round(translations).to(dtype=t.int32)
 
+    # We gather all the windows from the object in one indexing operation,
+    # rather than slicing them out one translation at a time
+    if upsample_obj:
+        window_shape = (probe.shape[-2]//2, probe.shape[-1]//2)
+    else:
+        window_shape = probe.shape[-2:]
+
+    rows = integer_translations[:,0,None] + \
+        t.arange(window_shape[0], device=obj.device)
+    cols = integer_translations[:,1,None] + \
+        t.arange(window_shape[1], device=obj.device)
+    selections = obj[rows[:,:,None], cols[:,None,:]]
+
     if upsample_obj:
-        selections = t.stack([obj[tr[0]:tr[0]+probe.shape[-2]//2,
-                                  tr[1]:tr[1]+probe.shape[-1]//2]
-                              for tr in integer_translations])
         selections = image_processing.fourier_upsample(selections,
                                                        preserve_mean=True)
 
-    else:
-        selections = t.stack([obj[tr[0]:tr[0]+probe.shape[-2],
-                              tr[1]:tr[1]+probe.shape[-1]]
-                          for tr in integer_translations])
-
 
     if multiple_modes:
         # if the probe dimension is 4, then this hasn't yet been broadcast
@@ -333,60 +338,63 @@ def ptycho_2D_linear(probe, obj, translations, shift_probe=True):
     subpixel_translations = translations - integer_translations
     integer_translations = integer_translations.to(dtype=t.int32)
 
-    exit_waves = []
+    # The bilinear weights for every translation, broadcastable against
+    # the NxMxL stack of windows. They are cast to match the array being
+    # shifted, so that they never promote its dtype
+    shifted = probe if shift_probe else obj
+    subpixel_translations = subpixel_translations.to(dtype=shifted.real.dtype)
+    sp_i = subpixel_translations[:,0,None,None]
+    sp_j = subpixel_translations[:,1,None,None]
+
+    # We gather all the object windows in one indexing operation, instead
+    # of slicing them out one translation at a time. The extra row and
+    # column are only needed when the object is subpixel shifted
+    extra = 0 if shift_probe else 1
+    rows = integer_translations[:,0,None] + \
+        t.arange(probe.shape[-2] + extra, device=obj.device)
+    cols = integer_translations[:,1,None] + \
+        t.arange(probe.shape[-1] + extra, device=obj.device)
+    obj_windows = obj[rows[:,:,None], cols[:,None,:]]
+
     if shift_probe:
-        for tr, sp in zip(integer_translations,
-                          subpixel_translations):
-            # This isn't perfectly symmetric but I think it's okay for now
-            # It should get the job done
-            # Basically, we shift the probe's position by a subpixel (i,j),
-            # rolling the edges of the array, and use that to multiply
-            # by the object
-            sel00 = probe[:,:]
-            sel01 = t.cat((probe[:,-1:],probe[:,:-1]),dim=1)
-            sel10 = t.cat((probe[-1:,:],probe[:-1,:]),dim=0)
-            sel11 = t.cat((sel01[-1:,:],sel01[:-1,:]),dim=0)
-
-            selection = sel00 * (1-sp[0])*(1-sp[1]) + \
-                sel10 * sp[0]*(1-sp[1]) + \
-                sel01 * (1-sp[0])*sp[1] + \
-                sel11 * sp[0]*sp[1]
-
-            obj_slice = obj[tr[0]:tr[0]+probe.shape[0],
-                            tr[1]:tr[1]+probe.shape[1]]
-
-            exit_waves.append(selection * obj_slice)
+        # This isn't perfectly symmetric but I think it's okay for now
+        # It should get the job done
+        # Basically, we shift the probe's position by a subpixel (i,j),
+        # rolling the edges of the array, and use that to multiply
+        # by the object. The rolled probes don't depend on the translation,
+        # so they are only calculated once
+        sel00 = probe[:,:]
+        sel01 = t.cat((probe[:,-1:],probe[:,:-1]),dim=1)
+        sel10 = t.cat((probe[-1:,:],probe[:-1,:]),dim=0)
+        sel11 = t.cat((sel01[-1:,:],sel01[:-1,:]),dim=0)
+
+        selection = sel00 * (1-sp_i)*(1-sp_j) + \
+            sel10 * sp_i*(1-sp_j) + \
+            sel01 * (1-sp_i)*sp_j + \
+            sel11 * sp_i*sp_j
+
+        exit_waves = selection * obj_windows
     else:
-        for tr, sp in zip(integer_translations,
-                          subpixel_translations):
-            #
-            # Here we subpixel shift the object by (-i,-j) after
-            # slicing out the correct translation of the probe
-            #
-
-            sel00 = obj[tr[0]:tr[0]+probe.shape[0],
-                        tr[1]:tr[1]+probe.shape[1]]
-
-            sel01 = obj[tr[0]:tr[0]+probe.shape[0],
-                        tr[1]+1:tr[1]+1+probe.shape[1]]
-
-            sel10 = obj[tr[0]+1:tr[0]+1+probe.shape[0],
-                        tr[1]:tr[1]+probe.shape[1]]
-
-            sel11 = obj[tr[0]+1:tr[0]+1+probe.shape[0],
-                        tr[1]+1:tr[1]+1+probe.shape[1]]
-
-            selection = sel00 * (1-sp[0])*(1-sp[1]) + \
-                sel01 * (1-sp[0])*sp[1] + \
-                sel10 * sp[0]*(1-sp[1]) + \
-                sel11 * sp[0]*sp[1]
-
-            exit_waves.append(probe * selection)
+        #
+        # Here we subpixel shift the object by (-i,-j) after
+        # slicing out the correct translation of the probe
+        #
+        sel00 = obj_windows[:,:-1,:-1]
+        sel01 = obj_windows[:,:-1,1:]
+        sel10 = obj_windows[:,1:,:-1]
+        sel11 = obj_windows[:,1:,1:]
+
+        selection = sel00 * (1-sp_i)*(1-sp_j) + \
+            sel01 * (1-sp_i)*sp_j + \
+            sel10 * sp_i*(1-sp_j) + \
+            sel11 * sp_i*sp_j
+
+        exit_waves = probe * selection
 
     if single_translation:
         return exit_waves[0]
     else:
-        return t.stack(exit_waves)
+        return exit_waves
 
 
 def ptycho_2D_sinc(probe, obj, translations, shift_probe=True, padding=10, multiple_modes=True, probe_support=None):
@@ -439,11 +447,16 @@ def ptycho_2D_sinc(probe, obj, translations, shift_probe=True, padding=10, multi
     subpixel_translations = translations - integer_translations
     integer_translations = integer_translations.to(dtype=t.int32)
 
-    selections = t.stack([obj[..., tr[0]:tr[0]+probe.shape[-2],
-                              tr[1]:tr[1]+probe.shape[-1]]
-                          for tr in integer_translations])
+    # All the windows are gathered straight into one (N)x(...)xMxL tensor,
+    # instead of slicing out N separate windows and stacking them. Any
+    # leading object dimensions end up in front of the window indices, so
+    # we move the translation index back to the front
+    rows = integer_translations[:,0,None] + \
+        t.arange(probe.shape[-2], device=obj.device)
+    cols = integer_translations[:,1,None] + \
+        t.arange(probe.shape[-1], device=obj.device)
+    selections = obj[..., rows[:,:,None], cols[:,None,:]].movedim(-3, 0)
 
-    exit_waves = []
     if shift_probe:
         i = t.arange(probe.shape[-2],device=probe.device,dtype=t.float32) \
             - probe.shape[-2]//2
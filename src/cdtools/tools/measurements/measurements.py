@@ -17,6 +17,16 @@ from torch.nn.functional import avg_pool2d
 __all__ = ['intensity', 'incoherent_sum', 'quadratic_background']
 
 
+def _abs2(x):
+    """Returns the squared magnitude of a real or complex tensor
+
+    For complex tensors, this avoids the square root taken by t.abs
+    """
+    if x.is_complex():
+        return x.real**2 + x.imag**2
+    return x**2
+
+
 def intensity(wavefield, detector_slice=None, epsilon=1e-7, saturation=None, oversampling=1, simulate_finite_pixels=False):
     """Returns the intensity of a wavefield
     
@@ -48,7 +58,7 @@ def intensity(wavefield, detector_slice=None, epsilon=1e-7, saturation=None, ove
         pad2r = wavefield.shape[-1] - pad2l
         padded = t.nn.functional.pad(inverse_fft, (pad1l, pad1r, pad2l, pad2r))
         upsampled_field = t.fft.fft2(t.fft.ifftshift(padded, dim=(-2,-2)))
-        upsampled_intensity = t.abs(upsampled_field)**2
+        upsampled_intensity = _abs2(upsampled_field)
         ifft_intensity = t.fft.fftshift(t.fft.ifft2(upsampled_intensity), dim=(-2,-1))
         # Now we take a sinc function
         xs = t.arange(ifft_intensity.shape[-2])
@@ -60,7 +70,7 @@ def intensity(wavefield, detector_slice=None, epsilon=1e-7, saturation=None, ove
         blurred_intensity = t.fft.fft2(t.fft.ifftshift(mask * ifft_intensity, dim=(-2,-2)))
         output = blurred_intensity[...,::2,::2]
     else:
-        output = t.abs(wavefield)**2
+        output = _abs2(wavefield)
 
         
     
@@ -94,13 +104,13 @@ def incoherent_sum(wavefields, detector_slice=None, epsilon=1e-7, saturation=Non
 
     The (-3) index is the set of incoherently adding patterns, and any
     indexes further to the front correspond to the set of diffraction patterns
-    to measure. The (-2) and (-1) indices are the wavefield, and the final
-    index is the complex index
+    to measure. The (-2) and (-1) indices are the wavefield. Any number of
+    leading dimensions, including none, is accepted
     
     Parameters
     ----------
     wavefields : torch.Tensor
-        An LxJxMxNx stack of complex wavefields
+        An (Leading Dims)xJxMxN stack of complex wavefields
     detector_slice : slice
         Optional, a slice or tuple of slices defining a section of the simulation to return
     saturation : float
@@ -111,7 +121,8 @@ def incoherent_sum(wavefields, detector_slice=None, epsilon=1e-7, saturation=Non
     Returns
     -------
     sim_patterns : torch.Tensor 
-        A real LXMxN array storing the incoherently summed intensities
+        A real (Leading Dims)xMxN array storing the incoherently summed
+        intensities
     """
     if simulate_finite_pixels:
         inverse_fft = t.fft.fftshift(t.fft.ifft2(wavefields), dim=(-2,-1))
@@ -121,7 +132,7 @@ def incoherent_sum(wavefields, detector_slice=None, epsilon=1e-7, saturation=Non
         pad2r = wavefields.shape[-1] - pad2l
         padded = t.nn.functional.pad(inverse_fft, (pad1l, pad1r, pad2l, pad2r))
         upsampled_field = t.fft.fft2(t.fft.ifftshift(padded, dim=(-2,-2)))
-        upsampled_intensity = t.sum(t.abs(upsampled_field)**2, dim=-3)
+        upsampled_intensity = t.sum(_abs2(upsampled_field), dim=-3)
         ifft_intensity = t.fft.fftshift(t.fft.ifft2(upsampled_intensity), dim=(-2,-1))
         # Now we take a sinc function
         xs = t.arange(ifft_intensity.shape[-2])
@@ -133,7 +144,9 @@ def incoherent_sum(wavefields, detector_slice=None, epsilon=1e-7, saturation=Non
         blurred_intensity = t.fft.fft2(t.fft.ifftshift(mask * ifft_intensity, dim=(-2,-2)))
         output = t.abs(blurred_intensity[...,::2,::2])
     else:
-        output = t.sum(t.abs(wavefields)**2,dim=-3) 
+        # Summing the squares of the real and imaginary parts avoids the
+        # square root in t.abs, and is much faster
+        output = t.sum(_abs2(wavefields), dim=-3)
 
     # Now we apply oversampling
     if oversampling != 1:
@@ -173,6 +186,8 @@ def quadratic_background(wavefield, background, *args, detector_slice=None, meas
         Optional, a slice or tuple of slices defining a section of the simulation to return
     measurement : function
         Default is measurements.intensity, the measurement function to use.
+        It must return a newly allocated tensor, which the background is
+        added to in place
     saturation : float
         Optional, a maximum saturation value to clamp the resulting intensities to
     oversampling : int
@@ -187,13 +202,16 @@ def quadratic_background(wavefield, background, *args, detector_slice=None, meas
     if detector_slice is None:
         output = measurement(wavefield, *args, epsilon=epsilon,
                              oversampling=oversampling,
-                             simulate_finite_pixels=simulate_finite_pixels) \
-                             + background**2
+                             simulate_finite_pixels=simulate_finite_pixels)
     else:
         output = measurement(wavefield, *args, detector_slice=detector_slice,
                              epsilon=epsilon, oversampling=oversampling,
-                             simulate_finite_pixels=simulate_finite_pixels) \
-                            + background**2
+                             simulate_finite_pixels=simulate_finite_pixels)
+
+    # The measurement output is always a fresh tensor, so we can add the
+    # background in place rather than allocating another full stack of
+    # patterns
+    output += background**2
 
     # This has to be done after the background is added, hence we replicate
     # it here
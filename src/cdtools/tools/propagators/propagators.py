@@ -16,15 +16,41 @@ __all__ = ['far_field', 'near_field',
            'high_NA_far_field',
            'generate_generalized_angular_spectrum_propagator']
 
+def _centered_fft2(wavefront, fft2):
+    """Applies fft2 with the origin at the center of the input and output
+
+    This is fftshift(fft2(ifftshift(wavefront))), but for even shapes
+    the two shifts are replaced by multiplications with a checkerboard,
+    which avoids two full copies of the wavefront. The checkerboard is
+    built on the fly, which is cheap next to the FFT and keeps this free
+    of cached tensors.
+    """
+    shape = tuple(wavefront.shape[-2:])
+    if shape[0] % 2 != 0 or shape[1] % 2 != 0 or not wavefront.is_complex():
+        shifted = t.fft.ifftshift(wavefront, dim=(-1,-2))
+        propagated = fft2(shifted, norm='ortho')
+        return t.fft.fftshift(propagated, dim=(-1,-2))
+
+    i = t.arange(shape[0], device=wavefront.device)
+    j = t.arange(shape[1], device=wavefront.device)
+    # This is (-1)^(i+j), the phase ramp equivalent to an fftshift
+    checkerboard = (1 - 2 * ((i[:,None] + j[None,:]) % 2)).to(
+        dtype=wavefront.real.dtype)
+    propagated = fft2(wavefront * checkerboard, norm='ortho') * checkerboard
+    # The two shifts leave behind an overall sign of (-1)^(N/2 + M/2)
+    if (shape[0] // 2 + shape[1] // 2) % 2 != 0:
+        propagated = -propagated
+    return propagated
+
+
 def far_field(wavefront):
     """Implements a far-field propagator in torch
 
-    This accepts a torch tensor, where the last dimension
-    represents the real and imaginary components of the wavefield,
-    and returns the far-field propagated version of it assuming it matches the
-    detector dimensions. It assumes that the
-    propagation is purely far-field, without checking that the geometry
-    is consistent with that assumption.
+    This accepts a complex-valued torch tensor, where the last two
+    dimensions represent the wavefield, and returns the far-field
+    propagated version of it assuming it matches the detector dimensions.
+    It assumes that the propagation is purely far-field, without checking
+    that the geometry is consistent with that assumption.
 
 
     It also assumes that the real space wavefront is stored in an array
@@ -36,25 +62,23 @@ def far_field(wavefront):
     Parameters
     ----------
     wavefront : torch.Tensor
-        The JxNxMx2 stack of complex wavefronts to be propagated
+        The (Leading Dims)xNxM stack of complex wavefronts to be propagated
     
     Returns
     -------
     propagated : torch.Tensor
-        The JxNxMx2 propagated wavefield
+        The (Leading Dims)xNxM propagated wavefield
     """
     
-    shifted = t.fft.ifftshift(wavefront, dim=(-1,-2))
-    propagated = t.fft.fft2(shifted, norm='ortho')
-    return t.fft.fftshift(propagated, dim=(-1,-2))
+    return _centered_fft2(wavefront, t.fft.fft2)
 
 
 def inverse_far_field(wavefront):
     """Implements the inverse of the far-field propagator in torch
 
-    This accepts a torch tensor, where the last dimension
-    represents the real and imaginary components of the propagated wavefield,
-    and returns the un-propagated array.
+    This accepts a complex-valued torch tensor, where the last two
+    dimensions represent the propagated wavefield, and returns the
+    un-propagated array.
 
     It assumes that the real space wavefront is stored in an array
     [i,j] where i corresponds to the y-axis and j corresponds to the
@@ -65,16 +89,15 @@ def inverse_far_field(wavefront):
     Parameters
     ----------
     wavefront : torch.Tensor
-        The JxNxMx2 stack of complex wavefronts propagated to the far-field
+        The (Leading Dims)xNxM stack of complex wavefronts propagated to
+        the far-field
     
     Returns
     -------
     propagated : torch.Tensor
-        The JxNxMx2 exit wavefield
+        The (Leading Dims)xNxM exit wavefield
     """
-    shifted = t.fft.ifftshift(wavefront, dim=(-1,-2))
-    propagated = t.fft.ifft2(shifted, norm='ortho')
-    return t.fft.fftshift(propagated, dim=(-1,-2))
+    return _centered_fft2(wavefront, t.fft.ifft2)
 
 
 def generate_high_NA_k_intensity_map(sample_basis, det_basis,det_shape,distance, wavelength, *args, lens=False, **kwargs):
@@ -261,7 +284,7 @@ def high_NA_far_field(wavefront, k_map, intensity_map=None):
     Parameters
     ----------
     wavefront : torch.Tensor
-        The JxNxMx2 stack of complex wavefronts propagated to the far-field
+        The (J)xNxM stack of complex wavefronts to propagate to the far-field
     k_map : torch.Tensor
         The NxMx2 map accounting for high NA distortion, as generated by generate_high_NA_k_intensity_map
     intensity_map : torch.Tensor
@@ -271,7 +294,7 @@ def high_NA_far_field(wavefront, k_map, intensity_map=None):
     Returns
     -------
     propagated : torch.Tensor
-        The JxNxMx2 exit wavefield
+        The (J)xNxM propagated wavefield
 
 
     """
@@ -354,18 +377,20 @@ def generate_angular_spectrum_propagator(shape, spacing, wavelength, z, *args, b
     # Internally, the generalized propagation function is used, so we start
     # by creating an appropriate basis
     # This creates a real-valued tensor which matches the kind of complex
-    # number dtype requested in **kwargs
+    # number dtype requested in **kwargs. If a device is requested, we
+    # build everything there directly instead of moving it at the end
+    device = kwargs.get('device')
     if 'dtype' in kwargs:
-        basis = t.real(t.zeros([3,2], **kwargs))
+        basis = t.real(t.zeros([3,2], dtype=kwargs['dtype'], device=device))
     else:
-        basis = t.zeros([3,2], dtype=t.float32)
-    spacing = t.as_tensor(spacing, dtype=basis.dtype)
+        basis = t.zeros([3,2], dtype=t.float32, device=device)
+    spacing = t.as_tensor(spacing, dtype=basis.dtype, device=basis.device)
 
     basis[1,0] = -spacing[0]
     basis[0,1] = -spacing[1]
     # And similarly, the offset is just z along the z direction
     #offset = t.tensor([0,0,z], dtype=basis.dtype)
-    offset = t.zeros(3, dtype=basis.dtype)
+    offset = t.zeros(3, dtype=basis.dtype, device=basis.device)
     offset[2] = z
     
     # And we call the generalized function! 
@@ -382,12 +407,13 @@ def generate_angular_spectrum_propagator(shape, spacing, wavelength, z, *args, b
     # Bandlimiting is not implemented in the generalized function, because it
     # has a less clear meaning in that setting, so we apply it here instead
     if bandlimit is not None:
-        # No need to multiply by 2pi
-        ki = 2 * np.pi * t.fft.fftfreq(shape[0],spacing[0])
-        kj = 2 * np.pi * t.fft.fftfreq(shape[1],spacing[1])
-        Ki, Kj = t.meshgrid(ki,kj, indexing='ij')
-        min_radius = min(t.max(ki),t.max(kj))
-        Rs = t.sqrt((Ki/t.max(ki))**2 + (Kj/t.max(kj))**2)
+        # The mask is built directly on the propagator's device, so a
+        # propagator requested on the GPU doesn't get mixed with a CPU mask.
+        # Only the normalized frequencies matter, so we can skip the 2pi
+        ki = t.fft.fftfreq(int(shape[0]), device=propagator.device)
+        kj = t.fft.fftfreq(int(shape[1]), device=propagator.device)
+        Ki, Kj = t.meshgrid(ki / t.max(ki), kj / t.max(kj), indexing='ij')
+        Rs = t.sqrt(Ki**2 + Kj**2)
         propagator = propagator * (Rs < bandlimit)
         
     return propagator
@@ -472,14 +498,16 @@ def generate_generalized_angular_spectrum_propagator(shape, basis, wavelength, o
 
     # make sure everything is in pytorch, and set the propagation vector
     # appropriately if propagate_along_offset is chosen
-    basis = t.as_tensor(basis)
-    offset_vector = t.as_tensor(offset_vector, dtype=basis.dtype)
+    basis = t.as_tensor(basis, device=kwargs.get('device'))
+    offset_vector = t.as_tensor(offset_vector, dtype=basis.dtype,
+                                device=basis.device)
 
     if propagate_along_offset:
         propagation_vector = offset_vector
         
     if propagation_vector is not None:
-        propagation_vector = t.as_tensor(propagation_vector, dtype=basis.dtype)
+        propagation_vector = t.as_tensor(propagation_vector, dtype=basis.dtype,
+                                         device=basis.device)
 
     #
     # In this section, we calculate the wavevectors associated with each
@@ -490,8 +518,10 @@ def generate_generalized_angular_spectrum_propagator(shape, basis, wavelength, o
     inv_basis =  t.linalg.pinv(basis).transpose(0,1)
 
     # Then we calculate the frequencies in (i,j) space
-    ki = 2 * np.pi * t.fft.fftfreq(shape[0], dtype=inv_basis.dtype)
-    kj = 2 * np.pi * t.fft.fftfreq(shape[1], dtype=inv_basis.dtype)
+    ki = 2 * np.pi * t.fft.fftfreq(shape[0], dtype=inv_basis.dtype,
+                                   device=inv_basis.device)
+    kj = 2 * np.pi * t.fft.fftfreq(shape[1], dtype=inv_basis.dtype,
+                                   device=inv_basis.device)
     K_ij = t.stack(t.meshgrid(ki,kj, indexing='ij'))
     
     # Now we convert these to frequencies in reciprocal space
@@ -600,12 +630,11 @@ def generate_generalized_angular_spectrum_propagator(shape, basis, wavelength, o
 def near_field(wavefront, angular_spectrum_propagator):
     """ Propagates a wavefront via the angular spectrum method
 
-    This function accepts an 3D torch tensor, where the last dimension
-    represents the real and imaginary components of the wavefield, and
-    returns the near-field propagated version of it. It does this
-    using the supplied angular spectrum propagator, which is a premade
-    phase mask representing the Fourier transform of the kernel for
-    light propagation in the desired geometry.
+    This function accepts a complex-valued torch tensor, where the last two
+    dimensions represent the wavefield, and returns the near-field propagated
+    version of it. It does this using the supplied angular spectrum
+    propagator, which is a premade phase mask representing the Fourier
+    transform of the kernel for light propagation in the desired geometry.
 
 
     Parameters
@@ -620,18 +649,18 @@ def near_field(wavefront, angular_spectrum_propagator):
     propagated : torch.Tensor
         The propagated wavefront 
     """
-    return t.fft.ifft2(angular_spectrum_propagator * t.fft.fft2(wavefront))
+    return t.fft.ifft2(angular_spectrum_propagator
+                       * t.fft.fft2(wavefront, dim=(-2,-1)), dim=(-2,-1))
 
 
 
 def inverse_near_field(wavefront, angular_spectrum_propagator):
     """ Inverse propagates a wavefront via the angular spectrum method
 
-    This function accepts an 3D torch tensor, where the last dimension
-    represents the real and imaginary components of the wavefield, and
-    returns the near-field propagated version of it. It does this
-    using the supplied angular spectrum propagator, which is a premade
-    phase mask.
+    This function accepts a complex-valued torch tensor, where the last two
+    dimensions represent the wavefield, and returns the inverse near-field
+    propagated version of it. It does this using the supplied angular
+    spectrum propagator, which is a premade phase mask.
 
     It propagates the wave using the complex conjugate of the supplied
     phase mask. This corresponds to propagation backward across the original
@@ -652,7 +681,7 @@ def inverse_near_field(wavefront, angular_spectrum_propagator):
     Parameters
     ----------
     wavefront : torch.Tensor
-        The JxNxMx2 stack of complex wavefronts to be propagated
+        The (Leading Dims)xNxM stack of complex wavefronts to be propagated
     angular_spectrum_propagator : torch.Tensor
         The NxM phase mask to be applied during propagation
 
@@ -661,8 +690,8 @@ def inverse_near_field(wavefront, angular_spectrum_propagator):
     propagated : torch.Tensor
         The inverse propagated wavefront
     """
-    return t.fft.ifft2(t.fft.fft2(wavefront)
-                       * t.conj(angular_spectrum_propagator))
+    return t.fft.ifft2(t.fft.fft2(wavefront, dim=(-2,-1))
+                       * t.conj(angular_spectrum_propagator), dim=(-2,-1))
 
 
 
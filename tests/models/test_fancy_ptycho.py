@@ -1,10 +1,170 @@
 import pytest
 import cdtools
 import torch as t
+import numpy as np
+import pickle
+from copy import deepcopy
 
 import cdtools
 from matplotlib import pyplot as plt
 
+
+@pytest.fixture
+def small_dataset():
+    # A small, synthetic dataset with a realistic geometry, for quick
+    # checks of the model that don't need a reconstruction
+    det_basis = np.array([[0, -50e-6, 0],
+                          [-50e-6, 0, 0]]).transpose()
+    i, j = np.meshgrid(np.arange(5), np.arange(5), indexing='ij')
+    translations = 2e-7 * np.stack([i.ravel(), j.ravel(), 0 * i.ravel()],
+                                   axis=-1)
+    patterns = np.random.rand(25, 32, 32).astype(np.float32)
+    return cdtools.datasets.Ptycho2DDataset(
+        translations, patterns, wavelength=1e-9,
+        detector_geometry={'basis': det_basis, 'distance': 0.1})
+
+
+def test_get_masked_probe(small_dataset):
+    model = cdtools.models.FancyPtycho.from_dataset(
+        small_dataset, n_modes=2, probe_support_radius=8)
+
+    with t.no_grad():
+        masked = model.get_masked_probe()
+        assert t.allclose(masked, model.probe * model.probe_support)
+
+        # Writes through .data must show up in the next masked probe
+        model.probe.data *= 3
+        assert t.allclose(model.get_masked_probe(), 3 * masked)
+
+
+def test_single_shot_with_weight_matrix(small_dataset):
+    model = cdtools.models.FancyPtycho.from_dataset(
+        small_dataset, n_modes=2, dm_rank=2)
+    translations = model.corrected_translations(small_dataset)
+
+    with t.no_grad():
+        batch = model.forward(t.arange(4), translations[:4])
+        single = model.forward(2, translations[2])
+
+    assert single.shape == batch.shape[1:]
+    assert t.allclose(single, batch[2], rtol=1e-4)
+
+
+def test_single_shot_with_probe_translation(small_dataset):
+    model = cdtools.models.FancyPtycho.from_dataset(
+        small_dataset, n_modes=2, simulate_probe_translation=True)
+    translations = model.corrected_translations(small_dataset)
+
+    with t.no_grad():
+        batch = model.forward(t.arange(4), translations[:4])
+        single = model.forward(2, translations[2])
+
+    assert single.shape == batch.shape[1:]
+    assert t.allclose(single, batch[2], rtol=1e-4)
+
+
+def test_half_precision_propagation_checks(small_dataset):
+    # The propagated wavefields must have a power-of-two shape
+    with pytest.raises(ValueError):
+        cdtools.models.FancyPtycho.from_dataset(
+            small_dataset, oversampling=3, half_precision_propagation=True)
+
+    # And complex32 FFTs only run on CUDA
+    model = cdtools.models.FancyPtycho.from_dataset(
+        small_dataset, half_precision_propagation=True)
+    translations = model.corrected_translations(small_dataset)
+    if not t.cuda.is_available():
+        with pytest.raises(RuntimeError):
+            model.forward(t.arange(4), translations[:4])
+
+
+def require_compile_backend():
+    # torch.compile needs a working backend (for inductor, a C compiler),
+    # which isn't available everywhere
+    try:
+        t.compile(lambda x: 2 * x + 1)(t.ones(3))
+    except Exception as e:
+        pytest.skip(f'no working torch.compile backend: {e}')
+
+
+def test_compile_forward(small_dataset):
+    require_compile_backend()
+    model = cdtools.models.FancyPtycho.from_dataset(
+        small_dataset, n_modes=2, probe_support_radius=8)
+    translations = model.corrected_translations(small_dataset)
+
+    with t.no_grad():
+        eager = model.forward(t.arange(4), translations[:4])
+        model.compile_forward()
+        compiled = model._compiled_forward(
+            model, t.arange(4), translations[:4])
+
+    assert t.allclose(compiled, eager, rtol=1e-4, atol=1e-6 * eager.max())
+
+    model.uncompile_forward()
+    assert model._compiled_forward is None
+
+
+def test_compiled_model_deepcopy_and_pickle(small_dataset):
+    require_compile_backend()
+    model = cdtools.models.FancyPtycho.from_dataset(small_dataset, n_modes=2)
+    translations = model.corrected_translations(small_dataset)
+    model.compile_forward()
+
+    # The copies must run their own parameters, not the original model's
+    for copied in (deepcopy(model), pickle.loads(pickle.dumps(model))):
+        with t.no_grad():
+            copied.probe.data *= 2
+            eager = copied.forward(t.arange(4), translations[:4])
+            compiled = copied._compiled_forward(
+                copied, t.arange(4), translations[:4])
+            original = model.forward(t.arange(4), translations[:4])
+
+        assert t.allclose(compiled, eager, rtol=1e-4,
+                          atol=1e-6 * eager.max())
+        assert not t.allclose(compiled, original)
+
+
+def test_compile_probes_and_translations(small_dataset):
+    require_compile_backend()
+    model = cdtools.models.FancyPtycho.from_dataset(
+        small_dataset, n_modes=2, dm_rank=2)
+    translations = model.corrected_translations(small_dataset)
+
+    with t.no_grad():
+        eager_prs, eager_trans = model.probes_and_translations(
+            t.arange(4), translations[:4])
+        model.compile_probes_and_translations()
+        prs, trans = model._compiled_probes_and_translations(
+            model, t.arange(4), translations[:4])
+
+    assert t.allclose(prs, eager_prs, rtol=1e-4, atol=1e-6)
+    assert t.allclose(trans, eager_trans)
+
+    # A copy must build its probes from its own parameters
+    copied = deepcopy(model)
+    with t.no_grad():
+        copied.probe.data *= 2
+        prs, _ = copied._compiled_probes_and_translations(
+            copied, t.arange(4), translations[:4])
+
+    assert t.allclose(prs, 2 * eager_prs, rtol=1e-4, atol=1e-6)
+
+
+@pytest.mark.skipif(not t.cuda.is_available(), reason='requires CUDA')
+def test_half_precision_propagation(small_dataset):
+    model = cdtools.models.FancyPtycho.from_dataset(small_dataset, n_modes=2)
+    model.to(device='cuda')
+    translations = model.corrected_translations(small_dataset)
+
+    with t.no_grad():
+        full = model.forward(t.arange(4), translations[:4])
+        model.half_precision_propagation = True
+        half = model.forward(t.arange(4), translations[:4])
+
+    assert half.dtype == full.dtype
+    assert t.allclose(half, full, rtol=1e-2, atol=1e-2 * full.max())
+
 @pytest.mark.slow
 def test_lab_ptycho(lab_ptycho_cxi, reconstruction_device, show_plot):
 
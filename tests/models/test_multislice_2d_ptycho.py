@@ -0,0 +1,29 @@
+import cdtools
+import torch as t
+import numpy as np
+
+
+def test_load_baseline_state_dict():
+    det_geo = {'distance': 0.5,
+               'basis': np.array([[0, -1e-5], [-1e-5, 0], [0, 0]])}
+    probe_basis = np.array([[0, -1e-7], [-1e-7, 0], [0, 0]])
+    model = cdtools.models.Multislice2DPtycho(
+        5e-7, det_geo, probe_basis, t.ones(1, 32, 32),
+        t.ones(2, 64, 64), 1e-6, 2)
+
+    # Checkpoints from before the object was stored as a single real
+    # view have separate real and imaginary parts, and no detector geometry
+    obj = t.rand(2, 64, 64, dtype=t.complex64)
+    state_dict = {
+        'probe_real': t.rand(1, 32, 32),
+        'probe_imag': t.rand(1, 32, 32),
+        'obj_real': obj.real,
+        'obj_imag': obj.imag,
+        'background': t.rand(32, 32),
+    }
+    model.load_state_dict(state_dict, strict=True)
+
+    assert t.equal(model.obj.detach(), obj)
+    assert t.equal(model.background.detach(), state_dict['background'])
+    assert set(model.state_dict().keys()) == \
+        {'probe_real', 'probe_imag', 'obj_ri', 'background'}
@@ -51,6 +51,12 @@ def test_product_svd():
     # it's redundant with the first check but I'm not sure
     assert np.allclose(prod_Vh, prod_U)
 
+    # Skipping the left singular vectors shouldn't change the rest
+    U_4, S_4, Vh_4 = analysis.product_svd(A, B, compute_u=False)
+    assert U_4 is None
+    assert np.allclose(S_4, S_3)
+    assert np.allclose(Vh_4, Vh_3)
+
 
 def test_orthogonalize_probes():
 
@@ -316,6 +322,34 @@ def test_calc_deconvolved_cross_correlation():
     
     assert np.allclose(test_cor_t.numpy(), np_cor)
 
+    # test with large float32 images, whose squared correlation spectrum
+    # would overflow a float32
+    obj1 = 1e7 * np.random.rand(64,64)
+    obj2 = np.roll(obj1, 2, axis=0)
+    cor_fft = np.fft.fft2(obj1) * np.conj(np.fft.fft2(obj2))
+    np_cor = np.fft.ifft2(cor_fft / np.abs(cor_fft))
+    test_cor_t = analysis.calc_deconvolved_cross_correlation(
+        t.as_tensor(obj1, dtype=t.float32),
+        t.as_tensor(obj2, dtype=t.float32), im_slice=np.s_[:,:])
+
+    assert np.allclose(test_cor_t.numpy(), np_cor, atol=1e-5)
+
+    # test with a spectrum that is exactly zero in a column of bins. Those
+    # bins have no phase, and should be left out instead of giving nans
+    obj1 = np.random.rand(64,64) + 1j * np.random.rand(64,64)
+    obj2 = np.zeros((64,64))
+    obj2[0,0], obj2[0,1] = 1, -1
+    cor_fft = np.fft.fft2(obj1) * np.conj(np.fft.fft2(obj2))
+    assert np.sum(cor_fft == 0) == 64
+    np_cor = np.fft.ifft2(np.divide(cor_fft, np.abs(cor_fft),
+                                    out=np.zeros_like(cor_fft),
+                                    where=(cor_fft != 0)))
+    test_cor = analysis.calc_deconvolved_cross_correlation(
+        obj1, obj2, im_slice=np.s_[:,:])
+
+    assert np.all(np.isfinite(test_cor))
+    assert np.allclose(test_cor, np_cor)
+
     
 def test_calc_frc():
 
@@ -380,6 +414,78 @@ def test_calc_frc():
     assert np.allclose(frc, test_frc_t.numpy())
     assert np.allclose(threshold, test_threshold_t.numpy())
 
+
+def test_calc_generalized_frc():
+
+    basis = np.array([[0,2e-8,0],
+                      [3e-8,0,0]]).transpose()
+    nbins = 12
+    snr = 2
+
+    # A simple reference, which finds each ring with a mask
+    def reference_frc(fields_1, fields_2, limit):
+        f1 = t.fft.fftshift(t.fft.fft2(fields_1.to(t.complex128)),
+                            dim=(-1,-2))
+        f2 = t.fft.fftshift(t.fft.fft2(fields_2.to(t.complex128)),
+                            dim=(-1,-2))
+
+        i_freqs = np.fft.fftshift(np.fft.fftfreq(f1.shape[-2], d=2e-8))
+        j_freqs = np.fft.fftshift(np.fft.fftfreq(f1.shape[-1], d=3e-8))
+        Js, Is = np.meshgrid(j_freqs, i_freqs)
+        Rs = np.sqrt(Is**2 + Js**2)
+        if limit == 'side':
+            frc_range = [0, max(np.max(i_freqs), np.max(j_freqs))]
+        else:
+            frc_range = [0, np.max(Rs)]
+        n_pix, bins = np.histogram(Rs, bins=nbins, range=frc_range)
+
+        frc = []
+        for i in range(nbins):
+            mask = t.as_tensor((Rs >= bins[i]) & (Rs < bins[i+1]))
+            masked_f1 = f1 * mask
+            masked_f2 = f2 * mask
+            numerator = t.sqrt(analysis.calc_fidelity(masked_f1, masked_f2))
+            denominator_f1 = t.sqrt(
+                analysis.calc_fidelity(masked_f1, masked_f1))
+            denominator_f2 = t.sqrt(
+                analysis.calc_fidelity(masked_f2, masked_f2))
+            frc.append(numerator / t.sqrt(denominator_f1 * denominator_f2))
+
+        threshold = (snr/2 + (snr + 1) / np.sqrt(n_pix)) / \
+            (1 + snr/2 + (2 * np.sqrt(snr/2)) / np.sqrt(n_pix))
+        return bins[:-1], t.stack(frc).numpy(), threshold
+
+    # calc_generalized_frc isn't exported, so we use it from the module
+    calc_generalized_frc = analysis.analysis.calc_generalized_frc
+
+    # Odd and even shapes, with and without leading dimensions
+    for shape in [(3,33,47), (2,2,40,64)]:
+        for dtype in [t.complex128, t.float64]:
+            fields_1 = t.rand(shape, dtype=dtype)
+            fields_2 = fields_1 + 0.5 * t.rand(shape, dtype=dtype)
+            for limit in ['side', 'corner']:
+                bins, frc, threshold = reference_frc(
+                    fields_1, fields_2, limit)
+                test_bins, test_frc, test_threshold = calc_generalized_frc(
+                    fields_1, fields_2, basis, nbins=nbins, snr=snr,
+                    limit=limit)
+
+                assert np.allclose(bins, test_bins.numpy())
+                assert np.allclose(frc, test_frc.numpy())
+                assert np.allclose(threshold, test_threshold.numpy())
+
+    # And with numpy input, including for the pixel size basis
+    fields_1 = t.rand(2,31,28, dtype=t.complex128)
+    fields_2 = t.rand(2,31,28, dtype=t.complex128)
+    bins, frc, threshold = reference_frc(fields_1, fields_2, 'side')
+    test_bins, test_frc, test_threshold = calc_generalized_frc(
+        fields_1.numpy(), fields_2.numpy(), basis, nbins=nbins, snr=snr)
+
+    assert isinstance(test_frc, np.ndarray)
+    assert np.allclose(bins, test_bins)
+    assert np.allclose(frc, test_frc)
+    assert np.allclose(threshold, test_threshold)
+
     
 def test_calc_rms_error():
     field_1 = t.rand(14,19, dtype=t.complex64)
@@ -37,6 +37,11 @@ def test_intensity():
     # With a single field
     assert t.allclose(measurements.intensity(wavefields[0],epsilon=epsilon, oversampling=2),
                       t.as_tensor(np_oversampling_result[0],))
+
+    # With real-valued wavefields
+    real_wavefields = t.rand((5,10,10))
+    assert t.allclose(measurements.intensity(real_wavefields,epsilon=epsilon),
+                      real_wavefields**2 + epsilon)
     
 
 def test_incoherent_sum():
@@ -75,6 +80,12 @@ def test_incoherent_sum():
     assert t.allclose(measurements.incoherent_sum(wavefields[0,:],epsilon=epsilon, oversampling=2),
                       t.as_tensor(np_oversampling_result[0],))
 
+    # With real-valued wavefields
+    real_wavefields = t.rand((5,4,10,10))
+    assert t.allclose(
+        measurements.incoherent_sum(real_wavefields,epsilon=epsilon),
+        t.sum(real_wavefields**2, dim=-3) + epsilon)
+
 
 def test_quadratic_background():
     # test with intensity
@@ -40,6 +40,26 @@ def test_inverse_far_field(exit_waves_1):
     assert(np.allclose(exit_waves_1, propagators.inverse_far_field(far_field_np_result)))
 
 
+def test_far_field_shapes():
+    # Checks the far-field propagators against explicit shifts for even,
+    # odd and mixed-parity shapes, with leading dimensions
+    def explicit(wavefront, fft2):
+        shifted = t.fft.ifftshift(wavefront, dim=(-1,-2))
+        return t.fft.fftshift(fft2(shifted, norm='ortho'), dim=(-1,-2))
+
+    for shape in [(3,2,16,20), (2,14,16), (2,15,17), (4,16,17), (17,16)]:
+        wavefront = t.rand(shape, dtype=t.complex128)
+        assert t.allclose(propagators.far_field(wavefront),
+                          explicit(wavefront, t.fft.fft2))
+        assert t.allclose(propagators.inverse_far_field(wavefront),
+                          explicit(wavefront, t.fft.ifft2))
+
+    # And with a real-valued input
+    wavefront = t.rand(2,16,20, dtype=t.float64)
+    assert t.allclose(propagators.far_field(wavefront),
+                      explicit(wavefront, t.fft.fft2))
+
+
 def test_generate_high_NA_k_intensity_map():
 
     # We need to generate a plausible scenario. I will start